@@ -0,0 +1,115 @@
+"""
+Measures how much it costs to encode one websocket broadcast
+
+Compares serializing the message for every client (old behaviour) with
+encoding it once into a shared `Frame`, and with sending clients a patch
+against the previous message. Run from the repository root:
+
+    python benchmarks/websocket_encode.py
+
+"""
+
+import gzip
+import json
+import os
+import sys
+import timeit
+from functools import partial
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from overlay.websocket import Frame
+
+REPEATS = 200
+CLIENTS = (1, 2, 5, 10, 20, 50)
+
+
+def player_data_message(players: int = 8):
+    """ Message of the same shape `process_game` creates for a 4v4"""
+    return {
+        "type": "player_data",
+        "data": {
+            "map": "Dry Arabia",
+            "mode": 20,
+            "started": "2022-10-26T18:12:44.000Z",
+            "ranked": True,
+            "server": "Europe",
+            "match_id": 12345678,
+            "players": [{
+                'civ': "Holy Roman Empire",
+                'name': f"Player name {i}",
+                'team': 1 + i % 2,
+                'rating': "1234",
+                'rank': "RM#1234",
+                'wins': "123",
+                'losses': "98",
+                'winrate': "55.7%",
+                'civ_games': "64",
+                'civ_winrate': "54.2%",
+                'civ_win_length_median': "24:13"
+            } for i in range(players)]
+        }
+    }
+
+
+def rating_changed(message):
+    """ The same message after one player's rating changed"""
+    data = json.loads(json.dumps(message['data']))
+    data['players'][0]['rating'] = "1250"
+    return {**message, 'data': data}
+
+
+def per_client(message, clients: int):
+    for _ in range(clients):
+        json.dumps(message)
+
+
+def per_client_gzip(message, clients: int):
+    for _ in range(clients):
+        gzip.compress(json.dumps(message).encode(), compresslevel=6)
+
+
+def shared(message, clients: int):
+    frame = Frame(message, 1)
+    for _ in range(clients):
+        frame.data(use_gzip=False)
+
+
+def shared_gzip(message, clients: int):
+    frame = Frame(message, 1)
+    for _ in range(clients):
+        frame.data(use_gzip=True)
+
+
+def shared_patch(message, clients: int, previous):
+    frame = Frame(message, 2, previous)
+    for _ in range(clients):
+        frame.patch
+
+
+def measure(func, message, clients: int) -> float:
+    """ Returns microseconds per broadcast"""
+    total = timeit.timeit(lambda: func(message, clients), number=REPEATS)
+    return total / REPEATS * 1e6
+
+
+if __name__ == '__main__':
+    message = player_data_message()
+    size = len(json.dumps(message))
+    # Clients with `?delta` get a patch against the previous player_data
+    updated = rating_changed(message)
+    base = Frame(message, 1)
+    patch = partial(shared_patch, previous=(base.id, base.decoded_data()))
+    patch_size = len(Frame(updated, 2, (base.id, base.decoded_data())).patch)
+    print(f"player_data message: {size} bytes, patch: {patch_size} bytes,"
+          f" {REPEATS} broadcasts each")
+    print(f"{'clients':>8} {'per client':>12} {'shared':>10}"
+          f" {'gzip per client':>16} {'gzip shared':>12} {'patch':>10}"
+          "  (µs/broadcast)")
+    for clients in CLIENTS:
+        print(f"{clients:>8}"
+              f" {measure(per_client, message, clients):>12.1f}"
+              f" {measure(shared, message, clients):>10.1f}"
+              f" {measure(per_client_gzip, message, clients):>16.1f}"
+              f" {measure(shared_gzip, message, clients):>12.1f}"
+              f" {measure(patch, updated, clients):>10.1f}")
@@ -1,6 +1,12 @@
 // Websocket connection
 var function_is_running = false;
 var PORT = 7307;
+// Large messages can be received gzipped if the browser can decompress them
+var USE_GZIP = typeof DecompressionStream !== "undefined";
+// Keeps messages in order while gzipped ones are being decompressed
+var message_chain = Promise.resolve();
+// Receive changes as patches of previously acknowledged messages
+var USE_DELTA = true;
 
 $(document).ready(connect_to_socket);
 
@@ -9,14 +15,28 @@ function connect_to_socket() {
 
     console.log("Trying to connect...");
     function_is_running = true;
-    let socket = new WebSocket(`ws://localhost:${PORT}`);
+    let options = [];
+    if (USE_GZIP) options.push("gzip");
+    if (USE_DELTA) options.push("delta");
+    let socket = new WebSocket(`ws://localhost:${PORT}/?${options.join("&")}`);
     socket.onopen = function (e) {
         console.log("CONNECTED");
     };
     socket.onmessage = function (event) {
-        let data = JSON.parse(event.data);
-        console.log(`New event: ${event.data}`);
-        parse_message(data);
+        message_chain = message_chain.then(() => decode_message(event.data)).then(text => {
+            console.log(`New event: ${text}`);
+            let data = JSON.parse(text);
+            if (parse_message(data)) {
+                if (USE_DELTA) socket.send(JSON.stringify({ type: "ack", id: data.id }));
+            } else {
+                // The patch couldn't be applied, ask for full messages
+                socket.send(JSON.stringify({ type: "resync" }));
+            }
+        }).catch(error => {
+            console.log('ERROR: ' + error);
+            // The stored data might not match the server anymore
+            if (USE_DELTA) socket.send(JSON.stringify({ type: "resync" }));
+        });
     };
 
     socket.onclose = function (event) {
@@ -31,6 +51,13 @@ function connect_to_socket() {
     };
 }
 
+function decode_message(data) {
+    if (typeof data === "string") return data;
+    // Binary frames are gzipped JSON
+    let stream = data.stream().pipeThrough(new DecompressionStream("gzip"));
+    return new Response(stream).text();
+}
+
 function reconnect_to_socket() {
     console.log('Reconnecting..')
     function_is_running = false;
@@ -43,11 +70,90 @@ function reconnect_to_socket() {
 var team_colors = [[74, 255, 2, 0.35], [3, 179, 255, 0.35], [255, 0, 0, 0.35]];
 var custom_func = null;
 
+// Last full data received for each message type
+var message_data = {};
+var message_ids = {};
+
+// Stored data is never passed on, so changes made to it (e.g. in custom.js)
+// don't get into the data later patches are applied to
+function copy_data(data) {
+    return JSON.parse(JSON.stringify(data));
+}
+
+// Returns `false` if the message was a patch that couldn't be applied
 function parse_message(data) {
+    if (data.type == "patch")
+        return apply_patch_message(data);
+    message_data[data.type] = data.data;
+    message_ids[data.type] = data.id;
     if (data.type == "color")
         team_colors = data.data;
     else if (data.type == "player_data")
-        update_player_data(data.data)
+        update_player_data(copy_data(data.data))
+    return true;
+}
+
+function apply_patch_message(message) {
+    if (message_data[message.target] === undefined || message_ids[message.target] != message.base)
+        return false;
+    // Patch a copy, so a failing operation leaves the stored data untouched
+    let data = copy_data(message_data[message.target]);
+    for (const operation of message.patch)
+        data = apply_operation(data, operation);
+    message_data[message.target] = data;
+    message_ids[message.target] = message.id;
+    if (message.target == "player_data")
+        update_player_data_partially(copy_data(data), message.patch);
+    return true;
+}
+
+// Applies one JSON-patch operation (add, replace, remove)
+function apply_operation(data, operation) {
+    let keys = operation.path.split("/").slice(1).map(key => key.replace(/~1/g, "/").replace(/~0/g, "~"));
+    if (keys.length == 0) return operation.value;
+    let parent = data;
+    for (const key of keys.slice(0, -1))
+        parent = parent[key];
+    let last = keys[keys.length - 1];
+    if (operation.op == "remove") {
+        if (Array.isArray(parent)) parent.splice(Number(last), 1);
+        else delete parent[last];
+    }
+    else parent[last] = operation.value;
+    return data;
+}
+
+// Player fields that can be updated in place
+var player_fields = ["name", "rank", "rating", "winrate", "wins", "losses"];
+
+function update_player_data_partially(data, patch) {
+    for (const operation of patch) {
+        let keys = operation.path.split("/").slice(1);
+        if (keys.length == 1 && ["match_id", "started", "ranked", "server", "mode"].includes(keys[0]))
+            continue;
+        if (keys.length == 1 && keys[0] == "map") {
+            $("#map").text(data.map);
+            continue;
+        }
+        if (keys.length == 3 && keys[0] == "players" && player_fields.includes(keys[2])) {
+            let player = data.players[Number(keys[1])];
+            $(`[data-player="${keys[1]}"] .${keys[2]}`).text(player_text(player, keys[2]));
+            continue;
+        }
+        if (keys.length == 3 && keys[0] == "players" && keys[2].startsWith("civ_"))
+            continue;
+        // Changes in team composition or civilizations need the whole table
+        update_player_data(data);
+        return;
+    }
+    if (custom_func != null) custom_func(data)
+}
+
+function player_text(player, field) {
+    // Whether to add W/L or not
+    if (field == "wins") return player.wins == '' ? '' : `${player.wins}W`;
+    if (field == "losses") return player.losses == '' ? '' : `${player.losses}L`;
+    return player[field];
 }
 
 function update_player_data(data) {
@@ -55,20 +161,18 @@ function update_player_data(data) {
     let team_data = { 1: "", 2: "" };
     let first_team = null;
     let second_team = null;
-    for (const p of data.players) {
+    for (const [index, p] of data.players.entries()) {
         if (first_team == null) first_team = p.team;
         // Decide where to place flag 
         let flag = `<td class="flag" rowspan="2"><img src="../img/flags/${p.civ}.webp"></td>`;
         let t1f = '';
         let t2f = '';
         if (p.team == first_team) t1f = flag; else t2f = flag;
-        let wins, losses;
-        // Whether to add W/L or not
-        if (p.wins == '') wins = ''; else wins = `${p.wins}W`;
-        if (p.losses == '') losses = ''; else losses = `${p.losses}L`;
+        let wins = player_text(p, "wins");
+        let losses = player_text(p, "losses");
         // Create player element
-        let s = `<tr class="player">${t1f}<td colspan="5" class="name">${p.name}</td>${t2f}</tr>
-        <tr class="stats"><td class="rank">${p.rank}</td><td class="rating">${p.rating}</td>
+        let s = `<tr class="player" data-player="${index}">${t1f}<td colspan="5" class="name">${p.name}</td>${t2f}</tr>
+        <tr class="stats" data-player="${index}"><td class="rank">${p.rank}</td><td class="rating">${p.rating}</td>
         <td class="winrate">${p.winrate}</td><td class="wins">${wins}</td><td class="losses">${losses}</td></tr>`;
         if ([1, 2].includes(p.team))
             team_data[p.team] += s;
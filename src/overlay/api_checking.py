@@ -1,16 +1,32 @@
+import asyncio
+import concurrent.futures
+import hashlib
 import json
 import time
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import (Any, Callable, Deque, Dict, Iterable, Iterator, List,
+                    Optional, Tuple)
 
+import aiohttp
 import requests
 
 from overlay.logging_func import get_logger
+from overlay.match_store import match_store
 from overlay.settings import settings
 
 logger = get_logger(__name__)
 session = requests.session()
 
+LEADERBOARD_IDS = (17, 18, 19, 20)
+REQUEST_TIMEOUT = 10
+# Rating history points requested when looking for new ones
+RATING_HISTORY_AMOUNTS = (10, 150)
+# Shares `session` so requests reuse its connections
+_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=len(LEADERBOARD_IDS), thread_name_prefix="api")
+
 
 def find_player(text: str) -> bool:
     """ Tries to find a player based on a text containing either name, steam_id or profile_id
@@ -66,7 +82,7 @@ def get_rating_history(leaderboard_id: int, amount: int = 1) -> List[Any]:
     else:
         return []
 
-    resp = session.get(url).text
+    resp = session.get(url, timeout=REQUEST_TIMEOUT).text
     try:
         return json.loads(resp)
     except:
@@ -74,6 +90,25 @@ def get_rating_history(leaderboard_id: int, amount: int = 1) -> List[Any]:
         return []
 
 
+def get_new_rating_history(
+        leaderboard_id: int,
+        since: Optional[int] = None) -> List[Tuple[int, int]]:
+    """ Downloads rating history newer than `since` timestamp
+
+    Returns new (timestamp, rating) points, oldest first."""
+    # Ask for a few points first and for more only when all are new
+    amounts = RATING_HISTORY_AMOUNTS if since else RATING_HISTORY_AMOUNTS[-1:]
+    for amount in amounts:
+        history = get_rating_history(leaderboard_id, amount)
+        points = sorted(
+            (i['timestamp'], i['rating']) for i in history
+            if i.get('rating') is not None and (
+                since is None or i['timestamp'] > since))
+        if len(points) < amount:
+            break
+    return points
+
+
 # Not used anymore
 def get_leaderboard_data(leaderboard_id: int) -> Dict[str, Any]:
     """ Gets leaderboard data for the main player"""
@@ -86,7 +121,7 @@ def get_leaderboard_data(leaderboard_id: int) -> Dict[str, Any]:
     else:
         return {}
 
-    resp = session.get(url).text
+    resp = session.get(url, timeout=REQUEST_TIMEOUT).text
     try:
         return json.loads(resp)
     except:
@@ -94,80 +129,398 @@ def get_leaderboard_data(leaderboard_id: int) -> Dict[str, Any]:
         return {}
 
 
-def get_full_match_history(amount: int) -> Optional[List[Any]]:
-    """ Gets match history and adds some data its missing"""
+def get_for_leaderboards(function: Callable,
+                         *args,
+                         leaderboard_ids: Iterable[int] = LEADERBOARD_IDS,
+                         timeout: float = 2 * REQUEST_TIMEOUT,
+                         **kwargs) -> Dict[int, Any]:
+    """ Calls `function(leaderboard_id, *args, **kwargs)` for all leaderboards at once
+
+    Returns results by leaderboard id. Leaderboards that failed or didn't
+    finish within `timeout` seconds are left out."""
+    futures = {
+        _executor.submit(function, leaderboard_id, *args, **kwargs):
+        leaderboard_id
+        for leaderboard_id in leaderboard_ids
+    }
+    done, not_done = concurrent.futures.wait(futures, timeout=timeout)
+
+    result = dict()
+    for future in done:
+        leaderboard_id = futures[future]
+        try:
+            result[leaderboard_id] = future.result()
+        except Exception:
+            logger.exception(
+                f"Failed to get data for leaderboard {leaderboard_id}")
+    for future in not_done:
+        future.cancel()
+        logger.warning(
+            f"Timed out getting data for leaderboard {futures[future]}")
+    return result
+
+
+def iter_match_history(amount: int,
+                       since: Optional[str] = None,
+                       page_size: int = 50) -> Iterator[List[Any]]:
+    """ Yields pages of match history (newest games first) as they are downloaded
+
+    With `since` only games started after that are returned.
+    Raises an exception when a page fails to download."""
+    page = 1
+    downloaded = 0
+    while downloaded < amount:
+        url = f"https://aoe4world.com/api/v0/players/{settings.profile_id}/games?limit={page_size}&page={page}"
+        if since is not None:
+            url += f"&since={since}"
+        games = json.loads(session.get(url, timeout=30).text)['games']
+        if games[:amount - downloaded]:
+            yield games[:amount - downloaded]
+        downloaded += len(games)
+        if len(games) < page_size:
+            return
+        page += 1
+
+
+def get_full_match_history(amount: int,
+                           since: Optional[str] = None) -> Optional[List[Any]]:
+    """ Gets match history and adds some data its missing
+
+    With `since` only games started after that are returned"""
+    try:
+        return [
+            game for page in iter_match_history(amount, since)
+            for game in page
+        ]
+    except Exception:
+        logger.exception("")
+        return None
+
+
+def sync_match_history(amount: int, progress_callback=None) -> Optional[int]:
+    """ Emits pages of match history through `progress_callback`
+
+    Stored games are emitted right away, then only games newer than those
+    are downloaded (page by page). They are stored only once all pages are
+    downloaded, otherwise older games of an interrupted sync would be skipped.
+    Returns the number of downloaded games or `None` if it failed."""
+    profile_id = settings.profile_id
+    emit = progress_callback.emit if progress_callback else lambda page: None
+
+    since = None
+    if profile_id is not None:
+        try:
+            since = match_store.latest_started_at(profile_id)
+            for page in match_store.iter_games(profile_id, amount):
+                emit(page)
+        except Exception:
+            logger.exception("Failed to load stored match history")
 
-    url = f"https://aoe4world.com/api/v0/players/{settings.profile_id}/games?limit={amount}"
+    new_games = []
     try:
-        resp = session.get(url).text
-        data = json.loads(resp)
-        return data['games']
+        for page in iter_match_history(amount, since):
+            new_games.extend(page)
+            emit(page)
+        if profile_id is not None:
+            match_store.add_games(profile_id, new_games)
     except Exception:
         logger.exception("")
         return None
+    return len(new_games)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """ Returns seconds from `Retry-After` header (seconds or HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+class PollScheduler:
+    """ Decides how long to wait before the next check for a new game
+
+    Waits a bit after a new game is found, checks often after a game ended
+    (queues are short), backs off exponentially when nothing changes or
+    the API fails, and respects `Retry-After`."""
+
+    GAME_FOUND_DELAY = 30  # A new game won't start sooner
+    FAST_INTERVAL = 5  # Interval shortly after a game ended
+    FAST_PERIOD = 5 * 60  # How long after a game ended to check often
+    IDLE_STEP = 4  # Double the interval after this many unchanged responses
+    MAX_IDLE_FACTOR = 4  # Idle interval is at most `settings.interval` * this
+    MAX_ERROR_INTERVAL = 300
+
+    def __init__(self):
+        self.requests: int = 0
+        self.detections: int = 0
+        # Detection latency (seconds after game start) and requests needed
+        self.latencies: Deque[float] = deque(maxlen=50)
+        self.requests_per_detection: Deque[int] = deque(maxlen=50)
+        self.reset()
+
+    def reset(self):
+        self.polled: bool = False
+        self.game_found_at: Optional[float] = None
+        self.last_game_ended: Optional[float] = None
+        self.unchanged: int = 0
+        self.errors: int = 0
+        self.retry_after: Optional[float] = None
+        self.requests_since_detection: int = 0
+
+    def request_sent(self):
+        self.polled = True
+        self.requests += 1
+        self.requests_since_detection += 1
+
+    def unchanged_response(self):
+        self.errors = 0
+        self.unchanged += 1
+
+    def changed_response(self, data: Dict[str, Any]):
+        """ Updates the state with the last game data"""
+        self.errors = 0
+        self.unchanged = 0
+        if data.get('ongoing'):
+            # The previous game ended, no need to check often during this one
+            self.last_game_ended = None
+        elif data.get('duration'):
+            self.last_game_ended = data['started_sec'] + data['duration']
+
+    def error(self, retry_after: Optional[float] = None):
+        self.errors += 1
+        self.retry_after = retry_after
+
+    def game_found(self, data: Dict[str, Any]):
+        now = time.time()
+        self.game_found_at = now
+        requests, self.requests_since_detection = self.requests_since_detection, 0
+        # Finished games (e.g. the last one on start) don't say anything about latency
+        if not data.get('ongoing'):
+            return
+        self.detections += 1
+        self.latencies.append(now - data['started_sec'])
+        self.requests_per_detection.append(requests)
+        logger.info(
+            f"New game detected {self.latencies[-1]:.1f}s after its start ({self.requests_per_detection[-1]} requests) {self.metrics()}"
+        )
+
+    def next_interval(self) -> float:
+        """ Returns seconds to wait before the next request"""
+        if not self.polled:
+            return 0
+
+        if self.retry_after is not None:
+            retry_after, self.retry_after = self.retry_after, None
+            return retry_after
+
+        if self.errors:
+            return min(settings.interval * 2**self.errors,
+                       self.MAX_ERROR_INTERVAL)
+
+        now = time.time()
+        if self.game_found_at is not None:
+            since_found = now - self.game_found_at
+            self.game_found_at = None
+            if since_found < self.GAME_FOUND_DELAY:
+                return self.GAME_FOUND_DELAY - since_found
+
+        if (self.last_game_ended is not None
+                and now - self.last_game_ended < self.FAST_PERIOD):
+            return min(self.FAST_INTERVAL, settings.interval)
+
+        factor = min(2**(self.unchanged // self.IDLE_STEP),
+                     self.MAX_IDLE_FACTOR)
+        return settings.interval * factor
+
+    def metrics(self) -> Dict[str, Any]:
+        """ Returns detection latency and request counts"""
+        latency = sum(self.latencies) / len(
+            self.latencies) if self.latencies else 0
+        requests = sum(self.requests_per_detection) / len(
+            self.requests_per_detection) if self.requests_per_detection else 0
+        return {
+            "requests": self.requests,
+            "detections": self.detections,
+            "avg_latency": round(latency, 1),
+            "avg_requests_per_detection": round(requests, 1)
+        }
 
 
 class Api_checker:
+    """ Checks for new games on aoe4world.com
 
+    Runs on an asyncio event loop (shared with the websocket server) with
+    a single keep-alive HTTP session."""
     def __init__(self):
         self.force_stop = False  # To stop the thread
         self.force_check = False  # This can force a check of new data
         self.last_match_timestamp = datetime(1900, 1, 1, 0, 0, 0)
         self.last_rating_timestamp = datetime(1900, 1, 1, 0, 0, 0)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._http: Optional[aiohttp.ClientSession] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # ETag, Last-Modified and body hash of the last response for each url
+        self._validators: Dict[str, Dict[str, Any]] = {}
+        self.scheduler = PollScheduler()
 
     def reset(self):
         """ Resets last timestamps"""
         self.last_match_timestamp = datetime(1900, 1, 1, 0, 0, 0)
         self.last_rating_timestamp = datetime(1900, 1, 1, 0, 0, 0)
         self.force_check = True
-
-    def sleep(self, seconds: int) -> bool:
+        self._validators = {}
+        self.scheduler.reset()
+        self._call_in_loop(self._wake_up)
+
+    def stop(self):
+        """ Stops checking immediately, cancels requests in progress"""
+        self.force_stop = True
+        self._call_in_loop(self._cancel)
+
+    def _call_in_loop(self, function):
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(function)
+
+    def _wake_up(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    def _cancel(self):
+        if self._task is not None:
+            self._task.cancel()
+        if self._http is not None:
+            asyncio.ensure_future(self._http.close())
+            self._http = None
+
+    def http_session(self) -> aiohttp.ClientSession:
+        """ Returns HTTP session reusing connections between requests"""
+        if self._http is None or self._http.closed:
+            self._http = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=20, connect=10))
+        return self._http
+
+    async def get_if_modified(self, url: str) -> Optional[str]:
+        """ Returns response text or `None` when it's the same as the last time
+
+        Sends conditional requests when the server provided ETag/Last-Modified,
+        otherwise compares hashes of response bodies."""
+        validators = self._validators.get(url, {})
+        headers = {}
+        if 'etag' in validators:
+            headers['If-None-Match'] = validators['etag']
+        if 'last_modified' in validators:
+            headers['If-Modified-Since'] = validators['last_modified']
+
+        async with self.http_session().get(url, headers=headers) as resp:
+            if resp.status == 304:
+                return None
+            if resp.status == 429 or resp.status >= 500:
+                resp.raise_for_status()
+            text = await resp.text()
+            if resp.status != 200:
+                return text
+            etag = resp.headers.get('ETag')
+            last_modified = resp.headers.get('Last-Modified')
+
+        body_hash = hashlib.blake2b(text.encode(), digest_size=16).digest()
+        if validators.get('hash') == body_hash:
+            return None
+
+        validators = {'hash': body_hash}
+        if etag:
+            validators['etag'] = etag
+        if last_modified:
+            validators['last_modified'] = last_modified
+        self._validators[url] = validators
+        return text
+
+    async def sleep(self, seconds: float) -> bool:
         """ Sleeps while checking for force_stop
         Returns `True` if we need to stop the parent function"""
-        for _ in range(seconds * 2):
-            if self.force_stop:
-                return True
-
-            if self.force_check:
-                self.force_check = False
-                return False
+        self._wake = asyncio.Event()
+        if not self.force_stop and not self.force_check:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=seconds)
+            except asyncio.TimeoutError:
+                pass
 
-            time.sleep(0.5)
+        if self.force_stop:
+            return True
+        self.force_check = False
         return False
 
-    def check_for_new_game(self,
-                           delayed_seconds: int = 0
-                           ) -> Optional[Dict[str, Any]]:
+    async def check_for_new_game(self,
+                                 delayed_seconds: Optional[float] = None
+                                 ) -> Optional[Dict[str, Any]]:
         """ Continously check if there are a new game being played
-        Returns match data if there is a new game"""
+        Returns match data if there is a new game
 
-        if self.sleep(delayed_seconds):
+        Without `delayed_seconds` the first check is planned by the scheduler"""
+        self._task = asyncio.current_task()
+        if self.force_stop:
             return
 
-        while True:
-            result = self.get_data()
-            if result is not None:
-                return result
+        if delayed_seconds is None:
+            delayed_seconds = self.scheduler.next_interval()
 
-            if self.sleep(settings.interval):
+        try:
+            if await self.sleep(delayed_seconds):
                 return
 
-    def get_data(self) -> Optional[Dict[str, Any]]:
+            while True:
+                result = await self.get_data()
+                if result is not None:
+                    return result
+
+                if await self.sleep(self.scheduler.next_interval()):
+                    return
+        except asyncio.CancelledError:
+            return
+        finally:
+            self._task = None
+
+    async def get_data(self) -> Optional[Dict[str, Any]]:
         if self.force_stop:
             return
 
         # Get last match from aoe4world.com
         try:
             url = f"https://aoe4world.com/api/v0/players/{settings.profile_id}/games/last"
-            resp = session.get(url)
-            data = json.loads(resp.text)
+            self.scheduler.request_sent()
+            text = await self.get_if_modified(url)
+            # The last game didn't change
+            if text is None:
+                self.scheduler.unchanged_response()
+                return
+            data = json.loads(text)
+        except asyncio.CancelledError:
+            raise
+        except aiohttp.ClientResponseError as e:
+            retry_after = parse_retry_after(
+                e.headers.get('Retry-After') if e.headers else None)
+            logger.warning(
+                f"aoe4world responded with {e.status} (retry after: {retry_after})"
+            )
+            self.scheduler.error(retry_after)
+            return
         except Exception:
             logger.exception("")
+            self.scheduler.error()
             return
 
         if self.force_stop:
             return
+        # No last game (e.g. new profile), not a failure of the request
         if "error" in data:
+            self.scheduler.unchanged_response()
             return
 
         # Calc old leaderboard id
@@ -180,9 +533,11 @@ class Api_checker:
         # Calc started time
         started = datetime.strptime(data['started_at'],
                                     "%Y-%m-%dT%H:%M:%S.000Z")
-        data['started_sec'] = started.timestamp()
+        data['started_sec'] = started.replace(tzinfo=timezone.utc).timestamp()
+        self.scheduler.changed_response(data)
 
         # Show the last game
         if started > self.last_match_timestamp:  # and data['ongoing']:
             self.last_match_timestamp = started
+            self.scheduler.game_found(data)
             return data
@@ -0,0 +1,108 @@
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from PyQt5 import QtCore, QtGui
+
+from overlay.aoe4_data import civ_data
+from overlay.helper_func import file_path
+from overlay.logging_func import get_logger
+from overlay.worker import scheldule
+
+logger = get_logger(__name__)
+
+# (path, width, height, aspect ratio mode), size is `None` for original images
+AssetKey = Tuple[str, Optional[int], Optional[int], int]
+
+
+def flag_path(civ: str) -> str:
+    return file_path(f"img/flags/{civ}.webp")
+
+
+class ImageAssets:
+    """ Images shared by all widgets, cached for each size they are shown in
+
+    Images can be decoded and scaled in a worker thread with `preload`,
+    pixmaps are then created from them in the GUI thread."""
+    def __init__(self):
+        self._pixmaps: Dict[AssetKey, QtGui.QPixmap] = dict()
+        self._icons: Dict[str, QtGui.QIcon] = dict()
+        self._sizes: Set[Tuple[int, int, int]] = set()
+
+    def register_size(
+            self,
+            width: int,
+            height: int,
+            aspect: QtCore.Qt.AspectRatioMode = QtCore.Qt.IgnoreAspectRatio):
+        """ Registers a size that images will be preloaded in"""
+        self._sizes.add((width, height, int(aspect)))
+
+    def preload(self, paths: Iterable[str]):
+        """ Decodes and scales images to all registered sizes in the background"""
+        scheldule(self._add_images, self._load_images, list(paths),
+                  list(self._sizes))
+
+    def preload_flags(self):
+        self.preload(flag_path(civ) for civ in civ_data.values())
+
+    @staticmethod
+    def _load_images(
+        paths: List[str], sizes: List[Tuple[int, int, int]]
+    ) -> Dict[AssetKey, QtGui.QImage]:
+        """ Loads images in all sizes. QImages are safe to use outside GUI thread."""
+        result = dict()
+        for path in paths:
+            if not os.path.isfile(path):
+                continue
+            image = QtGui.QImage(path)
+            if image.isNull():
+                logger.warning(f"Failed to load image: {path}")
+                continue
+            result[path, None, None, 0] = image
+            for width, height, aspect in sizes:
+                result[path, width, height, aspect] = image.scaled(
+                    width, height, aspect, QtCore.Qt.FastTransformation)
+        return result
+
+    def _add_images(self, images: Dict[AssetKey, QtGui.QImage]):
+        for key, image in images.items():
+            if key not in self._pixmaps:
+                self._pixmaps[key] = QtGui.QPixmap.fromImage(image)
+
+    def pixmap(
+        self,
+        path: str,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        aspect: QtCore.Qt.AspectRatioMode = QtCore.Qt.IgnoreAspectRatio
+    ) -> QtGui.QPixmap:
+        """ Returns pixmap for `path` scaled to `width` and `height`
+
+        Images that weren't preloaded are loaded right away."""
+        key = (path, width, height, 0 if width is None else int(aspect))
+        if key in self._pixmaps:
+            return self._pixmaps[key]
+
+        original = self._pixmaps.get((path, None, None, 0))
+        if original is None:
+            original = QtGui.QPixmap(path)
+            self._pixmaps[path, None, None, 0] = original
+        if width is None:
+            return original
+
+        pixmap = original.scaled(width, height, aspect,
+                                 QtCore.Qt.FastTransformation)
+        self._pixmaps[key] = pixmap
+        return pixmap
+
+    def icon(self, path: str) -> QtGui.QIcon:
+        """ Returns icon for `path`
+
+        Icons of images that weren't loaded yet read the file when first shown."""
+        if path not in self._icons:
+            original = self._pixmaps.get((path, None, None, 0))
+            self._icons[path] = QtGui.QIcon(
+                path if original is None else original)
+        return self._icons[path]
+
+
+image_assets = ImageAssets()
@@ -1,7 +1,8 @@
 import json
 import os
+from collections import OrderedDict
 
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import QFileSystemWatcher, Qt
 from PyQt5.QtGui import QFont, QPixmap
 from PyQt5.QtWidgets import QLabel
 
@@ -25,6 +26,9 @@ civilization_flags = {
     'Zhu Xi\'s Legacy': 'civilization_flag/CivIcon-ZhuXiLegacyAoE4_spacing.png'
 }
 
+# maximal number of scaled pictures kept in memory by each display
+PIXMAP_CACHE_SIZE = 256
+
 
 def list_directory_files(directory: str, extension: str = None, recursive: bool = True) -> list:
     """List files in directory
@@ -196,6 +200,20 @@ def check_valid_aoe4_build_order_from_string(data_str: str) -> bool:
         return False
 
 
+def get_picture_key(path: str) -> str:
+    """Get the key of a picture in the pictures index
+
+    Parameters
+    ----------
+    path    path of the picture, relative to its pictures folder
+
+    Returns
+    -------
+    normalized path, matching the file system comparison rules
+    """
+    return os.path.normcase(os.path.normpath(path))
+
+
 def split_multi_label_line(line: str):
     """Split a line based on the @ markers and remove first/last empty elements
 
@@ -266,7 +284,8 @@ class MultiQLabelDisplay:
 
     def __init__(self, font_police: str, font_size: int, border_size: int, vertical_spacing: int,
                  color_default: list, image_height: int = -1,
-                 game_pictures_folder: str = None, common_pictures_folder: str = None):
+                 game_pictures_folder: str = None, common_pictures_folder: str = None,
+                 watch_pictures_folders: bool = False):
         """Constructor
 
         Parameters
@@ -279,6 +298,7 @@ class MultiQLabelDisplay:
         image_height              height of the images, negative if no picture to use
         game_pictures_folder      folder where the game pictures are located, None if no game picture to use
         common_pictures_folder    folder where the common pictures are located, None if no common picture to use
+        watch_pictures_folders    True to index the pictures again when the pictures folders change
         """
         # font and images
         self.font_police = font_police
@@ -309,6 +329,17 @@ class MultiQLabelDisplay:
         self.row_max_width = 0  # maximal width of a row
         self.row_total_height = 0  # cumulative height of all the rows (with vertical spacing)
 
+        # scaled pictures, least recently used first
+        self.pixmap_cache = OrderedDict()
+
+        # pictures path for each key (see 'get_picture_key'), game pictures replacing common ones
+        self.picture_paths = dict()
+        self.pictures_watcher = None
+        if watch_pictures_folders:
+            self.pictures_watcher = QFileSystemWatcher()
+            self.pictures_watcher.directoryChanged.connect(self.refresh_pictures)
+        self.index_pictures()
+
     def update_settings(self, font_police: str, font_size: int, border_size: int,
                         vertical_spacing: int, color_default: list, image_height: int = -1):
         """Update the settings
@@ -327,6 +358,8 @@ class MultiQLabelDisplay:
         # font and images
         self.font_police = font_police
         self.font_size = font_size
+        if image_height != self.image_height:  # cached pictures are scaled for the previous height
+            self.pixmap_cache.clear()
         self.image_height = image_height
 
         if (self.game_pictures_folder is not None) or (self.common_pictures_folder is not None):
@@ -428,6 +461,66 @@ class MultiQLabelDisplay:
             elif text_alignment == 'right':
                 label.setAlignment(Qt.AlignRight)
 
+    def index_pictures(self):
+        """Index the pictures of the game and common folders (recursive search)"""
+        picture_paths = dict()
+        directories = []
+        for folder in (self.common_pictures_folder, self.game_pictures_folder):  # game pictures have priority
+            if folder is None:
+                continue
+            for (root, _, files) in os.walk(folder):
+                directories.append(root)
+                for f in files:
+                    image_path = os.path.join(root, f)
+                    picture_paths[get_picture_key(os.path.relpath(image_path, folder))] = image_path
+        self.picture_paths = picture_paths
+
+        if self.pictures_watcher is not None:  # watch new sub-folders too
+            watched = set(self.pictures_watcher.directories())
+            new_directories = [directory for directory in directories if directory not in watched]
+            if len(new_directories) > 0:
+                self.pictures_watcher.addPaths(new_directories)
+
+    def refresh_pictures(self, _directory: str = None):
+        """Index the pictures again and forget the cached ones, called when a pictures folder changes"""
+        self.index_pictures()
+        self.pixmap_cache.clear()
+
+    def get_pixmap(self, image_path: str, image_width: int = None, image_height: int = None,
+                   transform: Qt.TransformationMode = Qt.SmoothTransformation) -> QPixmap:
+        """Get a scaled picture, loaded from disk only if not already cached
+
+        Parameters
+        ----------
+        image_path      path of the image
+        image_width     width of the scaled image, None to keep the aspect ratio
+        image_height    height of the scaled image, None to keep the aspect ratio
+        transform       transformation mode used to scale the image
+
+        Returns
+        -------
+        scaled pixmap
+        """
+        key = (image_path, image_width, image_height, transform)
+        pixmap = self.pixmap_cache.get(key)
+        if pixmap is not None:
+            self.pixmap_cache.move_to_end(key)
+            return pixmap
+
+        pixmap = QPixmap(image_path)
+        if image_height is not None:
+            if image_width is not None:  # scale to width and height
+                pixmap = pixmap.scaled(image_width, image_height, transformMode=transform)
+            else:  # scale to height
+                pixmap = pixmap.scaledToHeight(image_height, mode=transform)
+        elif image_width is not None:  # scale to width
+            pixmap = pixmap.scaledToWidth(image_width, mode=transform)
+
+        self.pixmap_cache[key] = pixmap
+        if len(self.pixmap_cache) > PIXMAP_CACHE_SIZE:
+            self.pixmap_cache.popitem(last=False)
+        return pixmap
+
     def add_row_from_picture_line(self, parent, line: str, labels_settings: list = None,
                                   use_pictures: bool = True):
         """Add a row of labels based on a line mixing text and images.
@@ -472,18 +565,8 @@ class MultiQLabelDisplay:
                 for split_id in range(split_count):  # loop on the line parts
                     label = QLabel('', parent)
 
-                    image_path = None  # assuming no image found
-
-                    if self.game_pictures_folder is not None:  # try first with the game folder
-                        game_image_path = os.path.join(self.game_pictures_folder, split_line[split_id])
-                        if os.path.isfile(game_image_path):
-                            image_path = game_image_path
-
-                    # try then with the common folder
-                    if (self.common_pictures_folder is not None) and (image_path is None):
-                        common_image_path = os.path.join(self.common_pictures_folder, split_line[split_id])
-                        if os.path.isfile(common_image_path):
-                            image_path = common_image_path
+                    # game folder first, then common folder (None if no image found)
+                    image_path = self.picture_paths.get(get_picture_key(split_line[split_id]))
 
                     if image_path is not None:  # image found
 
@@ -496,16 +579,8 @@ class MultiQLabelDisplay:
                             if labels_settings[split_id].image_height is not None:
                                 image_height = labels_settings[split_id].image_height
 
-                        if image_height is not None:
-                            if image_width is not None:  # scale to width and height
-                                label.setPixmap(QPixmap(image_path).scaled(image_width, image_height,
-                                                                           transformMode=Qt.SmoothTransformation))
-                            else:  # scale to height
-                                label.setPixmap(
-                                    QPixmap(image_path).scaledToHeight(image_height, mode=Qt.SmoothTransformation))
-                        elif image_width is not None:  # scale to width
-                            label.setPixmap(
-                                QPixmap(image_path).scaledToWidth(image_width, mode=Qt.SmoothTransformation))
+                        if (image_width is not None) or (image_height is not None):
+                            label.setPixmap(self.get_pixmap(image_path, image_width, image_height))
                     else:  # image not found
                         label.setText(split_line[split_id])
                         label.setFont(QFont(self.font_police, self.font_size))
@@ -1,6 +1,7 @@
 import bisect
 import math
 import time
+from array import array
 from typing import Iterable, List, Optional, Tuple, Union
 
 from PyQt5 import QtCore, QtGui, QtWidgets
@@ -13,6 +14,10 @@ logger = get_logger(__name__)
 COLORS = ((51, 120, 182), (246, 126, 0), (65, 160, 33), (205, 35, 33),
           (145, 103, 191), (136, 86, 74), (220, 119, 195), (127, 127, 127),
           (187, 189, 0), (68, 190, 208))
+# Points in one drawn polyline, long ones are slow to stroke
+POLYLINE_CHUNK = 32
+# Plots with more points per pixel column than this are decimated
+DECIMATE_FACTOR = 4
 
 
 def mmin(i: Iterable):
@@ -51,6 +56,54 @@ def get_ticks(vmin: float, vmax: float, tick_number: int = 10) -> List[float]:
     return ticks
 
 
+def decimate(x: array, y: array, start: int, x_min: float, x_max: float,
+             buckets: int) -> Tuple[array, array]:
+    """ Splits points from `start` into `buckets` equal ranges of x and
+    keeps only the first, last, min and max point of each
+
+    Drawn line looks the same, including its peaks, when there is a bucket
+    for each pixel column. Values have to be sorted by x."""
+    new_x = array('d')
+    new_y = array('d')
+    step = (x_max - x_min) / buckets
+    low = start
+    for bucket in range(1, buckets + 1):
+        if bucket == buckets:
+            high = len(x)
+        else:
+            high = bisect.bisect_left(x, x_min + bucket * step, low)
+        if high <= low:
+            continue
+        values = y[low:high]
+        kept = {
+            0,
+            values.index(min(values)),
+            values.index(max(values)),
+            len(values) - 1
+        }
+        for i in sorted(kept):
+            new_x.append(x[low + i])
+            new_y.append(values[i])
+        low = high
+    return new_x, new_y
+
+
+def to_polygon(x: array, y: array) -> QtGui.QPolygonF:
+    """ Converts x and y values to a polygon"""
+    size = len(x)
+    # QPointF is a pair of doubles, so interleaved x and y can be
+    # copied to the polygon memory directly
+    points = array('d', bytes(16 * size))
+    points[0::2] = x
+    points[1::2] = y
+    polygon = QtGui.QPolygonF(size)
+    if size:
+        pointer = polygon.data()
+        pointer.setsize(16 * size)
+        memoryview(pointer).cast('B')[:] = memoryview(points).cast('B')
+    return polygon
+
+
 class Box:
     """ Box used as a bounding box for a chart"""
     def __init__(self, x: int, y: int, width: int, height: int):
@@ -128,11 +181,32 @@ class GraphWidget(QtWidgets.QWidget):
         self.x_is_timestamp: bool = False
         # Used for limiting x-axis. Max difference in x shown from the max value.
         self.max_x_diff: int = -1
+        # Rendered chart, redrawn only when its key changes
+        self._data_version: int = 0
+        self._pixmap: Optional[QtGui.QPixmap] = None
+        self._pixmap_key: Optional[tuple] = None
+
+    def _render_key(self) -> tuple:
+        """ Everything the rendered chart depends on"""
+        return (self._data_version, self.width(), self.height(),
+                self.devicePixelRatioF(),
+                tuple(item["show"] for item in self._data), self.max_x_diff,
+                self.title, self.x_label, self.y_label, self.x_is_timestamp)
 
     def paintEvent(self, event):
         """ Override for draw event"""
         try:
-            self._draw_plot()
+            key = self._render_key()
+            if key != self._pixmap_key:
+                ratio = self.devicePixelRatioF()
+                self._pixmap = QtGui.QPixmap(self.size() * ratio)
+                self._pixmap.setDevicePixelRatio(ratio)
+                self._pixmap.fill(QtCore.Qt.transparent)
+                self._draw_plot(self._pixmap)
+                self._pixmap_key = key
+            qp = QtGui.QPainter(self)
+            qp.drawPixmap(0, 0, self._pixmap)
+            qp.end()
         except:
             logger.exception("Failed to plot")
 
@@ -143,11 +217,14 @@ class GraphWidget(QtWidgets.QWidget):
              linewidth: float = 3,
              show: bool = True,
              index: int = -1):
-        """ Simple line chart"""
+        """ Simple line chart (with x values in ascending order)"""
+        self._data_version += 1
         self._data.append({
             "type": "lineplot",
-            "x": x,
-            "y": y,
+            "x": array('d', x),
+            "y": array('d', y),
+            "polygon": None,
+            "decimated": None,
             "label": label,
             "linewidth": linewidth,
             "index": index,
@@ -156,6 +233,7 @@ class GraphWidget(QtWidgets.QWidget):
 
     def text(self, text: str, x: float, y: float, color: str = "black"):
         """ Add a text to the chart"""
+        self._data_version += 1
         self._data.append({
             "type": "text",
             "text": text,
@@ -165,8 +243,45 @@ class GraphWidget(QtWidgets.QWidget):
             "show": True
         })
 
+    def has_plot(self, index: int) -> bool:
+        """ Whether there is a plot with given `index`"""
+        return any(index == item.get("index", -1) for item in self._data)
+
+    def append_data(self, index: int, x: Iterable[float],
+                    y: Iterable[float]):
+        """ Appends points to the end of the plot with given `index`"""
+        for item in self._data:
+            if index == item.get("index", -1):
+                item["x"].extend(x)
+                item["y"].extend(y)
+                item["polygon"] = None
+                item["decimated"] = None
+                self._data_version += 1
+                return
+
+    @staticmethod
+    def _polygon(item) -> QtGui.QPolygonF:
+        """ Returns plot points in data coordinates, converted only once"""
+        if item["polygon"] is None:
+            item["polygon"] = to_polygon(item['x'], item['y'])
+        return item["polygon"]
+
+    @staticmethod
+    def _decimated_polygon(item, start: int, x_min: float, x_max: float,
+                           buckets: int) -> QtGui.QPolygonF:
+        """ Returns decimated plot points in data coordinates
+
+        They are computed again only when the shown range or size changes"""
+        key = (len(item['x']), start, x_min, x_max, buckets)
+        if item["decimated"] is None or item["decimated"][0] != key:
+            polygon = to_polygon(
+                *decimate(item['x'], item['y'], start, x_min, x_max, buckets))
+            item["decimated"] = (key, polygon)
+        return item["decimated"][1]
+
     def clear_data(self):
         """ Clears all current data"""
+        self._data_version += 1
         self._data = []
 
     def set_plot_visibility(self, index: int, visible: bool):
@@ -185,9 +300,11 @@ class GraphWidget(QtWidgets.QWidget):
 
         Returns:
             (x_min, x_max, y_min, y_max) """
+        plots = [i for i in self._data if i["show"] and len(i['x'])]
 
-        x_min = mmin([min(i['x']) for i in self._data if i["show"]])
-        x_max = mmax([max(i['x']) for i in self._data if i["show"]])
+        # Values are sorted by x
+        x_min = mmin([i['x'][0] for i in plots])
+        x_max = mmax([i['x'][-1] for i in plots])
 
         if self.max_x_diff > 0:
             # In case we are limiting maximum diff from x_max
@@ -196,20 +313,24 @@ class GraphWidget(QtWidgets.QWidget):
 
             y_mins = []
             y_maxs = []
-            for plot in self._data:
-                if not plot['show']:
-                    continue
-                y = [
-                    y for x, y in zip(plot['x'], plot['y'])
-                    if x_max - x < self.max_x_diff
-                ]
-                y_mins.append(mmin(y))
-                y_maxs.append(mmax(y))
+            for plot in plots:
+                start = bisect.bisect_right(plot['x'],
+                                            x_max - self.max_x_diff)
+                y = plot['y'][start:]
+                if len(y):
+                    y_mins.append(min(y))
+                    y_maxs.append(max(y))
             y_min = mmin(y_mins)
             y_max = mmax(y_maxs)
         else:
-            y_min = mmin([min(i['y']) for i in self._data if i["show"]])
-            y_max = mmax([max(i['y']) for i in self._data if i["show"]])
+            y_min = mmin([min(i['y']) for i in plots])
+            y_max = mmax([max(i['y']) for i in plots])
+
+        # Single value would have no range to draw
+        if x_min == x_max:
+            x_min, x_max = x_min - 1, x_max + 1
+        if y_min == y_max:
+            y_min, y_max = y_min - 1, y_max + 1
 
         return x_min, x_max, y_min, y_max
 
@@ -250,21 +371,20 @@ class GraphWidget(QtWidgets.QWidget):
 
     def _draw_line(self,
                    qp: QtGui.QPainter,
-                   points: List[Tuple[int, int]],
+                   points: Union[List[Tuple[int, int]], QtGui.QPolygonF],
                    linewidth: int = 2,
                    linestyle: QtCore.Qt.PenStyle = QtCore.Qt.SolidLine,
                    color: Union[QtGui.QColor,
                                 QtCore.Qt.GlobalColor] = QtCore.Qt.black):
         qp.setPen(QtGui.QPen(color, linewidth, linestyle))
-        for idx, point in enumerate(points):
-            # Skip the first one
-            if not idx:
-                continue
-            qp.drawLine(*points[idx - 1], *point)
+        if not isinstance(points, QtGui.QPolygonF):
+            points = QtGui.QPolygonF([QtCore.QPointF(*p) for p in points])
+        for start in range(0, max(len(points) - 1, 1), POLYLINE_CHUNK):
+            qp.drawPolyline(points.mid(start, POLYLINE_CHUNK + 1))
 
-    def _draw_plot(self):
+    def _draw_plot(self, device: QtGui.QPaintDevice):
         qp = QtGui.QPainter()
-        qp.begin(self)
+        qp.begin(device)
         qp.setPen(QtGui.QColor(0, 0, 0))
 
         # Bounding box
@@ -293,6 +413,11 @@ class GraphWidget(QtWidgets.QWidget):
             y_new = box.y_end - (y - y_min) * y_scaling
             return int(x_new), int(y_new)
 
+        # The same transformation for whole plots
+        transform = QtGui.QTransform(x_scaling, 0, 0, -y_scaling,
+                                     box.x_start - x_min * x_scaling,
+                                     box.y_end + y_min * y_scaling)
+
         # X-ticks
         x_ticks = get_ticks(x_min, x_max, 5)
         self._set_font(qp, 10)
@@ -334,10 +459,18 @@ class GraphWidget(QtWidgets.QWidget):
             if not data["show"]:
                 continue
             elif data["type"] == "lineplot":
-                points = [
-                    trans(x, y) for x, y in zip(data['x'], data['y'])
-                    if self.max_x_diff <= 0 or x_max - x < self.max_x_diff
-                ]
+                start = 0
+                if self.max_x_diff > 0:
+                    start = bisect.bisect_right(data['x'],
+                                                x_max - self.max_x_diff)
+                # Too narrow graphs (e.g. while resizing) have no pixel columns
+                if box.inner_width > 0 and (len(data['x']) - start >
+                                            DECIMATE_FACTOR * box.inner_width):
+                    points = transform.map(
+                        self._decimated_polygon(data, start, x_min, x_max,
+                                                box.inner_width))
+                else:
+                    points = transform.map(self._polygon(data).mid(start))
                 used_colors.append(QtGui.QColor(*COLORS[idx % len(COLORS)]))
                 self._draw_line(qp,
                                 points,
@@ -346,8 +479,10 @@ class GraphWidget(QtWidgets.QWidget):
 
                 # For limited range draw points as well
                 if self.max_x_diff > 0:
-                    qp.setPen(QtGui.QPen(QtCore.Qt.black, 3))
-                    [qp.drawEllipse(x - 2, y - 2, 4, 4) for x, y in points]
+                    qp.setPen(
+                        QtGui.QPen(QtCore.Qt.black, 7, QtCore.Qt.SolidLine,
+                                   QtCore.Qt.RoundCap))
+                    qp.drawPoints(points)
 
             elif data["type"] == "text":
                 point = trans(data['x'][0], data['y'][0])
@@ -4,7 +4,8 @@ import pathlib
 import sys
 import time
 import traceback
-from typing import Any, Dict, Optional, Union
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Union
 
 import requests
 from PyQt5 import QtCore
@@ -12,10 +13,16 @@ from PyQt5 import QtCore
 from overlay.aoe4_data import QM_ids
 from overlay.logging_func import get_logger
 from overlay.settings import settings
+from overlay.snapshots import GameSnapshot, PlayerSnapshot
 
 logger = get_logger(__name__)
 ROOT = pathlib.Path(sys.argv[0]).parent.absolute()
 
+# Processed player data by (game_id, profile_id, mode)
+PLAYER_CACHE_SIZE = 64
+_player_cache: "OrderedDict[Tuple[Any, Any, str], PlayerSnapshot]" = (
+    OrderedDict())
+
 
 def zeroed(value: Optional[int]) -> int:
     """ Returns `value` after replacing `None` with 0"""
@@ -81,18 +88,11 @@ def match_mode(match: Dict[str, Any], convert_customs: bool = True) -> int:
     return int(leaderboard_id)
 
 
-def process_game(game_data: Dict[str, Any]) -> Dict[str, Any]:
+def process_game(game_data: Dict[str, Any]) -> GameSnapshot:
     """ Processes game data returned by API
     
     Sorts players to main is at the top. Calculates winrates. 
     Gets text for civs and maps. Apart from `team`, all player data returned as string."""
-    result = {}
-    result['map'] = game_data['map']
-    result['mode'] = game_data['leaderboard_id']
-    result['started'] = game_data['started_at']
-    result['ranked'] = 'qm_' in game_data['kind'] or 'rm_' in game_data['kind']
-    result['server'] = game_data['server']
-    result['match_id'] = game_data['game_id']
     mode = game_data['kind']
 
     # aoe4world has a single rm_team rating that we'd like to use instead here
@@ -119,53 +119,75 @@ def process_game(game_data: Dict[str, Any]) -> Dict[str, Any]:
 
     players = sorted(players, key=sortingf)
 
-    # Add player data
-    result['players'] = []
-    for player in players:
-        # Avoid overwriting mode when falling back to QM/RM on a specific player
-        lookup_mode = mode
-        current_civ = player['civilization']
-        name = player['name'] if player['name'] is not None else "?"
-
-        civ_games = ""
-        civ_winrate = ""
-        civ_win_median = ""
-        try:
-            if not lookup_mode in player['modes']:
-                if 'rm_' in lookup_mode:
-                    lookup_mode = lookup_mode.replace('rm_', 'qm_')
-                elif 'qm_' in lookup_mode:
-                    lookup_mode = lookup_mode.replace('qm_', 'rm_')
-            if 'civilizations' in player['modes'][lookup_mode]:
-                for civ in player['modes'][lookup_mode]['civilizations']:
-                    if civ['civilization'] == current_civ:
-                        civ_games = str(civ['games_count'])
-                        civ_winrate = f"{civ['win_rate']/100:.1%}"
-                        med = civ['game_length']['wins_median']
-                        civ_win_median = time.strftime("%M:%S",
-                                                       time.gmtime(med))
-        except Exception:
-            print(traceback.format_exc())
-
-        mode_data = player.get('modes', {}).get(lookup_mode, {})
-        mode_str = lookup_mode.split('_')[0].upper()
-
-        data = {
-            'civ': current_civ.replace("_", " ").title(),
-            'name': name,
-            'team': zeroed(player['team'] + 1),
-            'rating': str(mode_data.get('rating', 0)),
-            'rank': f"{mode_str}#{mode_data.get('rank',0)}",
-            'wins': str(mode_data.get('wins_count', 0)),
-            'losses': str(mode_data.get('losses_count', 0)),
-            'winrate': f"{mode_data.get('win_rate', 0)}%",
-            'civ_games': civ_games,
-            'civ_winrate': civ_winrate,
-            'civ_win_length_median': civ_win_median
-        }
-        result['players'].append(data)
-
-    return result
+    return GameSnapshot(
+        map=game_data['map'],
+        players=[
+            player_data(player, mode, game_data['game_id'])
+            for player in players
+        ],
+        mode=game_data['leaderboard_id'],
+        started=game_data['started_at'],
+        ranked='qm_' in game_data['kind'] or 'rm_' in game_data['kind'],
+        server=game_data['server'],
+        match_id=game_data['game_id'])
+
+
+def player_data(player: Dict[str, Any], mode: str,
+                game_id: Any) -> PlayerSnapshot:
+    """ Returns processed data for a player in a game
+
+    Results are cached, so the same game processed again is cheap."""
+    key = (game_id, player['profile_id'], mode)
+    if player['profile_id'] is not None and key in _player_cache:
+        _player_cache.move_to_end(key)
+        return _player_cache[key]
+
+    # Avoid overwriting mode when falling back to QM/RM on a specific player
+    lookup_mode = mode
+    current_civ = player['civilization']
+    name = player['name'] if player['name'] is not None else "?"
+
+    civ_games = ""
+    civ_winrate = ""
+    civ_win_median = ""
+    try:
+        if not lookup_mode in player['modes']:
+            if 'rm_' in lookup_mode:
+                lookup_mode = lookup_mode.replace('rm_', 'qm_')
+            elif 'qm_' in lookup_mode:
+                lookup_mode = lookup_mode.replace('qm_', 'rm_')
+        if 'civilizations' in player['modes'][lookup_mode]:
+            for civ in player['modes'][lookup_mode]['civilizations']:
+                if civ['civilization'] == current_civ:
+                    civ_games = str(civ['games_count'])
+                    civ_winrate = f"{civ['win_rate']/100:.1%}"
+                    med = civ['game_length']['wins_median']
+                    civ_win_median = time.strftime("%M:%S", time.gmtime(med))
+                    break
+    except Exception:
+        print(traceback.format_exc())
+
+    mode_data = player.get('modes', {}).get(lookup_mode, {})
+    mode_str = lookup_mode.split('_')[0].upper()
+
+    data = PlayerSnapshot(civ=current_civ.replace("_", " ").title(),
+                          name=name,
+                          team=zeroed(player['team'] + 1),
+                          rating=str(mode_data.get('rating', 0)),
+                          rank=f"{mode_str}#{mode_data.get('rank',0)}",
+                          wins=str(mode_data.get('wins_count', 0)),
+                          losses=str(mode_data.get('losses_count', 0)),
+                          winrate=f"{mode_data.get('win_rate', 0)}%",
+                          civ_games=civ_games,
+                          civ_winrate=civ_winrate,
+                          civ_win_length_median=civ_win_median)
+
+    # AI players have no profile
+    if player['profile_id'] is not None:
+        _player_cache[key] = data
+        if len(_player_cache) > PLAYER_CACHE_SIZE:
+            _player_cache.popitem(last=False)
+    return data
 
 
 def strtime(t: Union[int, float], show_seconds: bool = False) -> str:
@@ -0,0 +1,70 @@
+import json
+import os
+import sqlite3
+from contextlib import closing
+from typing import Any, Dict, Iterator, List, Optional
+
+from overlay.logging_func import CONFIG_FOLDER, get_logger
+
+logger = get_logger(__name__)
+MATCH_DB_FILE = os.path.join(CONFIG_FOLDER, "match_history.sqlite")
+
+
+class MatchStore:
+    """ Stores finished games from aoe4world for each player
+
+    Every call opens its own connection, so it can be used from worker threads."""
+    def __init__(self, path: str = MATCH_DB_FILE):
+        self.path = path
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS games ("
+                             "profile_id INTEGER NOT NULL, "
+                             "game_id INTEGER NOT NULL, "
+                             "started_at TEXT NOT NULL, "
+                             "data TEXT NOT NULL, "
+                             "PRIMARY KEY (profile_id, game_id))")
+                conn.execute("CREATE INDEX IF NOT EXISTS games_started "
+                             "ON games (profile_id, started_at)")
+        except Exception:
+            logger.exception("Failed to create match history database")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def iter_games(self,
+                   profile_id: int,
+                   amount: int,
+                   page_size: int = 500) -> Iterator[List[Dict[str, Any]]]:
+        """ Yields pages of up to `amount` stored games, the newest first"""
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "SELECT data FROM games WHERE profile_id = ? "
+                "ORDER BY started_at DESC LIMIT ?", (profile_id, amount))
+            while True:
+                rows = cursor.fetchmany(page_size)
+                if not rows:
+                    return
+                yield [json.loads(row[0]) for row in rows]
+
+    def latest_started_at(self, profile_id: int) -> Optional[str]:
+        """ Returns `started_at` of the newest stored game"""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT MAX(started_at) FROM games WHERE profile_id = ?",
+                (profile_id, )).fetchone()
+        return row[0]
+
+    def add_games(self, profile_id: int, games: List[Dict[str, Any]]):
+        """ Saves finished games, ongoing ones will be saved once they end"""
+        rows = [(profile_id, game['game_id'], game['started_at'],
+                 json.dumps(game)) for game in games
+                if not game.get('ongoing')]
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO games "
+                "(profile_id, game_id, started_at, data) VALUES (?, ?, ?, ?)",
+                rows)
+
+
+match_store = MatchStore()
@@ -1,24 +1,19 @@
-from typing import Any, Dict
-
 from PyQt5 import QtCore, QtGui, QtWidgets
 
+from overlay.assets import flag_path, image_assets
 from overlay.custom_widgets import OverlayWidget, VerticalLabel
-from overlay.helper_func import file_path, zeroed
+from overlay.helper_func import zeroed
 from overlay.settings import settings
+from overlay.snapshots import GameSnapshot, PlayerSnapshot
 
-PIXMAP_CACHE = {}
+FLAG_SIZE = QtCore.QSize(60, 30)
+image_assets.register_size(FLAG_SIZE.width(), FLAG_SIZE.height())
 
 
 def set_pixmap(civ: str, widget: QtWidgets.QWidget):
-    """ Sets civ pixmap to a widget. Handles caching."""
-    if civ in PIXMAP_CACHE:
-        widget.setPixmap(PIXMAP_CACHE[civ])
-        return
-    path = file_path(f"img/flags/{civ}.webp")
-    pixmap = QtGui.QPixmap(path)
-    pixmap = pixmap.scaled(widget.width(), widget.height())
-    PIXMAP_CACHE[civ] = pixmap
-    widget.setPixmap(pixmap)
+    """ Sets civ pixmap scaled for the widget"""
+    widget.setPixmap(
+        image_assets.pixmap(flag_path(civ), widget.width(), widget.height()))
 
 
 class PlayerWidget:
@@ -53,7 +48,7 @@ class PlayerWidget:
     def create_widgets(self):
         # Separated so this can be changed in a child inner overlay for editing
         self.flag = QtWidgets.QLabel()
-        self.flag.setFixedSize(QtCore.QSize(60, 30))
+        self.flag.setFixedSize(FLAG_SIZE)
         self.name = QtWidgets.QLabel()
         self.rating = QtWidgets.QLabel()
         self.rank = QtWidgets.QLabel()
@@ -87,47 +82,46 @@ class PlayerWidget:
     def update_flag(self, ):
         set_pixmap(self.civ, self.flag)
 
-    def update_player(self, player_data: Dict[str, Any]):
+    def update_player(self, player_data: PlayerSnapshot):
         # Flag
-        self.civ = player_data['civ']
+        self.civ = player_data.civ
         self.update_flag()
 
         # Indicate team with background color
-        self.team = zeroed(player_data['team'])
+        self.team = zeroed(player_data.team)
         self.update_name_color()
 
         # Fill the rest
-        self.name.setText(player_data['name'])
-        self.rating.setText(player_data['rating'])
-        self.rank.setText(player_data['rank'])
-        self.winrate.setText(player_data['winrate'])
-        self.wins.setText(str(player_data['wins']))
-        self.losses.setText(player_data['losses'])
-        self.civ_games.setText(player_data['civ_games'])
-        self.civ_winrate.setText(player_data['civ_winrate'])
-        self.civ_median_wins.setText(player_data['civ_win_length_median'])
-        self.show(show=bool(player_data['name']))
+        self.name.setText(player_data.name)
+        self.rating.setText(player_data.rating)
+        self.rank.setText(player_data.rank)
+        self.winrate.setText(player_data.winrate)
+        self.wins.setText(str(player_data.wins))
+        self.losses.setText(player_data.losses)
+        self.civ_games.setText(player_data.civ_games)
+        self.civ_winrate.setText(player_data.civ_winrate)
+        self.civ_median_wins.setText(player_data.civ_win_length_median)
+        self.show(show=bool(player_data.name))
 
         # Hide civ specific data when there are none
-        if not player_data['civ_games'] and self.hiding_civ_stats:
+        if not player_data.civ_games and self.hiding_civ_stats:
             for widget in (self.civ_games, self.civ_winrate,
                            self.civ_median_wins):
                 widget.hide()
 
-    def get_data(self) -> Dict[str, Any]:
-        return {
-            'civ': self.civ,
-            'name': self.name.text(),
-            'team': self.team,
-            'rating': self.rating.text(),
-            'rank': self.rank.text(),
-            'wins': self.wins.text(),
-            'losses': self.losses.text(),
-            'winrate': self.winrate.text(),
-            'civ_games': self.civ_games.text(),
-            'civ_winrate': self.civ_winrate.text(),
-            'civ_win_length_median': self.civ_median_wins.text(),
-        }
+    def get_data(self) -> PlayerSnapshot:
+        return PlayerSnapshot(
+            civ=self.civ,
+            name=self.name.text(),
+            team=self.team,
+            rating=self.rating.text(),
+            rank=self.rank.text(),
+            wins=self.wins.text(),
+            losses=self.losses.text(),
+            winrate=self.winrate.text(),
+            civ_games=self.civ_games.text(),
+            civ_winrate=self.civ_winrate.text(),
+            civ_win_length_median=self.civ_median_wins.text())
 
 
 class AoEOverlay(OverlayWidget):
@@ -229,16 +223,16 @@ class AoEOverlay(OverlayWidget):
         if self.isVisible():
             self.show()
 
-    def update_data(self, game_data: Dict[str, Any]):
-        self.map.setText(game_data['map'])
+    def update_data(self, game_data: GameSnapshot):
+        self.map.setText(game_data.map)
         [p.show(False) for p in self.players]
 
         show_civ_stats = False
-        for i, player in enumerate(game_data['players']):
+        for i, player in enumerate(game_data.players):
             if i >= len(self.players):
                 break
             self.players[i].update_player(player)
-            if player['civ_games']:
+            if player.civ_games:
                 show_civ_stats = True
 
         # Show or hide civilization stats
@@ -260,9 +254,9 @@ class AoEOverlay(OverlayWidget):
             self.height()
         ]
 
-    def get_data(self) -> Dict[str, Any]:
-        result = {"map": self.map.text(), "players": []}
-        for player in self.players:
-            if player.visible:
-                result["players"].append(player.get_data())
-        return result
+    def get_data(self) -> GameSnapshot:
+        return GameSnapshot(map=self.map.text(),
+                            players=[
+                                player.get_data() for player in self.players
+                                if player.visible
+                            ])
@@ -0,0 +1,69 @@
+import os
+import struct
+from typing import List, Optional, Tuple
+
+from overlay.logging_func import CONFIG_FOLDER, get_logger
+
+logger = get_logger(__name__)
+RATING_CACHE_FOLDER = os.path.join(CONFIG_FOLDER, "rating_history")
+# Timestamp and rating of one point
+RECORD = struct.Struct("<qi")
+
+
+class RatingCache:
+    """ Stores rating history points for each player and leaderboard
+
+    Every series is a file of fixed size binary records, oldest first.
+    New points are only appended to it."""
+    def __init__(self, folder: str = RATING_CACHE_FOLDER):
+        self.folder = folder
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+        except Exception:
+            logger.exception("Failed to create rating history cache folder")
+
+    def _path(self, profile_id: int, leaderboard_id: int) -> str:
+        return os.path.join(self.folder, f"{profile_id}_{leaderboard_id}.bin")
+
+    def load(self, profile_id: int,
+             leaderboard_id: int) -> List[Tuple[int, int]]:
+        """ Returns all cached (timestamp, rating) points"""
+        try:
+            with open(self._path(profile_id, leaderboard_id), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        # Drop a partially written record
+        data = data[:len(data) - len(data) % RECORD.size]
+        return list(RECORD.iter_unpack(data))
+
+    def last_timestamp(self, profile_id: int,
+                       leaderboard_id: int) -> Optional[int]:
+        """ Returns the timestamp of the newest cached point"""
+        try:
+            with open(self._path(profile_id, leaderboard_id), 'rb') as f:
+                size = f.seek(0, os.SEEK_END)
+                size -= size % RECORD.size
+                if not size:
+                    return None
+                f.seek(size - RECORD.size)
+                return RECORD.unpack(f.read(RECORD.size))[0]
+        except FileNotFoundError:
+            return None
+
+    def append(self, profile_id: int, leaderboard_id: int,
+               points: List[Tuple[int, int]]):
+        """ Appends points newer than the cached ones"""
+        last = self.last_timestamp(profile_id, leaderboard_id)
+        if last is not None:
+            points = [point for point in points if point[0] > last]
+        if not points:
+            return
+        with open(self._path(profile_id, leaderboard_id), 'ab') as f:
+            size = f.seek(0, os.SEEK_END)
+            if size % RECORD.size:
+                f.truncate(size - size % RECORD.size)
+            f.write(b"".join(RECORD.pack(*point) for point in points))
+
+
+rating_cache = RatingCache()
@@ -12,6 +12,7 @@ class _Settings:
 
     def __init__(self):
         self.websocket_port: int = 7307
+        self.websocket_high_water_mark: int = 5  # max messages waiting for a client
         self.send_email_logs: bool = True
         self.log_matches: bool = True
         self.interval: int = 15
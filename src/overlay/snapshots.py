@@ -0,0 +1,101 @@
+from typing import Any, Dict, List, Optional
+
+
+class PlayerSnapshot:
+    """ Player data shown on the overlay. Apart from `team` all are texts.
+
+    Snapshots aren't modified after they are created, so they can be shared."""
+    __slots__ = ('civ', 'name', 'team', 'rating', 'rank', 'wins', 'losses',
+                 'winrate', 'civ_games', 'civ_winrate',
+                 'civ_win_length_median')
+
+    def __init__(self,
+                 civ: str = "",
+                 name: str = "",
+                 team: int = 0,
+                 rating: str = "",
+                 rank: str = "",
+                 wins: str = "",
+                 losses: str = "",
+                 winrate: str = "",
+                 civ_games: str = "",
+                 civ_winrate: str = "",
+                 civ_win_length_median: str = ""):
+        self.civ = civ
+        self.name = name
+        self.team = team
+        self.rating = rating
+        self.rank = rank
+        self.wins = wins
+        self.losses = losses
+        self.winrate = winrate
+        self.civ_games = civ_games
+        self.civ_winrate = civ_winrate
+        self.civ_win_length_median = civ_win_length_median
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, PlayerSnapshot):
+            return NotImplemented
+        return all(
+            getattr(self, name) == getattr(other, name)
+            for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"PlayerSnapshot({self.to_dict()})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class GameSnapshot:
+    """ Game shown on the overlay, players of the main player team first
+
+    Games edited in the override tab have only the map and players."""
+    # Fields in the order they are serialized
+    __slots__ = ('map', 'mode', 'started', 'ranked', 'server', 'match_id',
+                 'players')
+
+    def __init__(self,
+                 map: str,
+                 players: List[PlayerSnapshot],
+                 mode: Optional[Any] = None,
+                 started: Optional[str] = None,
+                 ranked: Optional[bool] = None,
+                 server: Optional[str] = None,
+                 match_id: Optional[int] = None):
+        self.map = map
+        self.players = players
+        self.mode = mode
+        self.started = started
+        self.ranked = ranked
+        self.server = server
+        self.match_id = match_id
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, GameSnapshot):
+            return NotImplemented
+        return all(
+            getattr(self, name) == getattr(other, name)
+            for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"GameSnapshot({self.to_dict()})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """ Players are converted too, unset metadata fields are left out"""
+        result = dict()
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if name == 'players':
+                result[name] = [player.to_dict() for player in value]
+            elif name == 'map' or value is not None:
+                result[name] = value
+        return result
+
+
+def to_json_default(value: Any) -> Dict[str, Any]:
+    """ `default` for `json.dumps` that serializes snapshots"""
+    if isinstance(value, (GameSnapshot, PlayerSnapshot)):
+        return value.to_dict()
+    raise TypeError(
+        f"Object of type {type(value).__name__} is not JSON serializable")
@@ -1,31 +1,29 @@
+import bisect
+import webbrowser
 from collections import defaultdict
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Set
 
-from PyQt5 import QtCore, QtWidgets
+from PyQt5 import QtCore, QtGui, QtWidgets
 
 from overlay.logging_func import catch_exceptions, get_logger
 from overlay.settings import settings
 
 logger = get_logger(__name__)
 
-
-class Line(QtWidgets.QFrame):
-
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.setStyleSheet("background-color: #bbb")
-        self.setMinimumHeight(1)
-        self.setMaximumHeight(1)
+HEADERS = ("Team 1", "Team 2", "Map", "Started", "Mode", "Result",
+           "Rating diff", "AoE4World")
+TEAM_COLUMNS = (0, 1)
+LINK_COLUMN = 7
 
 
 class MatchEntry:
+    """ Texts shown for one game in the match history table"""
+    __slots__ = ("game_id", "started_at", "link", "texts", "tooltips")
 
-    def __init__(self, layout: QtWidgets.QGridLayout, match_data: Dict[str,
-                                                                       Any]):
-        self.main_layout: QtWidgets.QGridLayout = layout
-        self.in_layout: bool = False
+    def __init__(self, match_data: Dict[str, Any]):
         self.game_id = match_data['game_id']
+        self.started_at: str = match_data['started_at']
 
         # Try to find the main player team first
         main_player_data = None
@@ -43,148 +41,182 @@ class MatchEntry:
             for player in team:
                 civ = player['player']['civilization'].replace(
                     "_", " ").capitalize()
-                teams[team_idx].append(
-                    f"{player['player']['name']} ({civ})   ")
+                teams[team_idx].append(f"{player['player']['name']} ({civ})")
 
         other_team = 1 if main_team == 0 else 0
-        team_widgets = []
-        for team in (main_team, other_team):
-            team_string = "\n".join(teams[team])
-            team_widgets.append(QtWidgets.QLabel(team_string))
+        team_texts = [", ".join(teams[team]) for team in (main_team, other_team)]
+        team_tooltips = [
+            "\n".join(teams[team]) for team in (main_team, other_team)
+        ]
 
         # Map
-        map_name = QtWidgets.QLabel(match_data.get('map', "Unknown map"))
+        map_name = match_data.get('map', "Unknown map")
 
         # Date
         started = datetime.strptime(match_data['started_at'],
                                     "%Y-%m-%dT%H:%M:%S.000Z")
-
-        date = QtWidgets.QLabel(started.strftime("%b %d, %H:%M:%S"))
+        date = started.strftime("%b %d, %H:%M:%S")
 
         # Mode
-        mode = QtWidgets.QLabel(match_data['kind'])
+        mode = match_data['kind']
 
         # Result
-        result = QtWidgets.QLabel(main_player_data['result'].capitalize(
-        ) if main_player_data and main_player_data['result'] else "?")
+        result = main_player_data['result'].capitalize(
+        ) if main_player_data and main_player_data['result'] else "?"
 
         # ELO change
         diff = main_player_data[
             'rating_diff'] if main_player_data and main_player_data[
                 'rating_diff'] else "?"
-        elo_change = QtWidgets.QLabel(str(diff))
 
         # aoe4world Link
-        game_id = match_data["game_id"]
-        link = QtWidgets.QLabel(
-            f'<a href="https://aoe4world.com/players/{settings.profile_id}/games/{game_id}"> game link</a>'
-        )
-        link.setOpenExternalLinks(True)
-
-        self.widgets = (*team_widgets, map_name, date, mode, result,
-                        elo_change, link)
-
-        for item in self.widgets:
-            if item != link:
-                item.setTextInteractionFlags(QtCore.Qt.TextSelectableByMouse)
-            if item not in team_widgets:
-                item.setAlignment(QtCore.Qt.AlignCenter)
-
-        # Line
-        self.line = Line()
-
-    def add_to_layout(self, row: int):
-        """ Adds widgets back to the layout"""
-        self.in_layout = True
-        for column, widget in enumerate(self.widgets):
-            self.main_layout.addWidget(widget, row, column)
-        self.main_layout.addWidget(self.line, row + 1, 0, 1, len(self.widgets))
-
-    def remove_from_layout(self):
-        """ Removes its widgets from the layout"""
-        self.in_layout = False
-        for widget in self.widgets:
-            self.main_layout.removeWidget(widget)
-        self.main_layout.removeWidget(self.line)
+        self.link = f"https://aoe4world.com/players/{settings.profile_id}/games/{self.game_id}"
+
+        self.texts = (*team_texts, map_name, date, mode, result, str(diff),
+                      "game link")
+        self.tooltips = (*team_tooltips, None, None, None, None, None,
+                         self.link)
+
+
+class MatchHistoryModel(QtCore.QAbstractTableModel):
+    """ Table model of match history. The newest games are first."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.entries: List[MatchEntry] = []
+        # `started_at` of entries from the oldest, for bisecting
+        self.started: List[str] = []
+        self.link_brush = QtGui.QBrush(QtGui.QColor("#3a8ddb"))
+
+    def clear(self):
+        self.beginResetModel()
+        self.entries = []
+        self.started = []
+        self.endResetModel()
+
+    def row_for(self, started_at: str) -> int:
+        """ Row where a game started at `started_at` belongs"""
+        return len(self.started) - bisect.bisect_left(self.started,
+                                                      started_at)
+
+    def insert_entry(self, entry: MatchEntry):
+        """ Inserts the entry to its row by the time it started"""
+        position = bisect.bisect_left(self.started, entry.started_at)
+        row = len(self.started) - position
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self.started.insert(position, entry.started_at)
+        self.entries.insert(row, entry)
+        self.endInsertRows()
+
+    def evict(self, max_rows: int) -> List[MatchEntry]:
+        """ Removes and returns the oldest entries over `max_rows`"""
+        extra = len(self.entries) - max_rows
+        if extra <= 0:
+            return []
+        self.beginRemoveRows(QtCore.QModelIndex(), max_rows,
+                             len(self.entries) - 1)
+        evicted = self.entries[max_rows:]
+        del self.entries[max_rows:]
+        del self.started[:extra]
+        self.endRemoveRows()
+        return evicted
+
+    def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.entries)
+
+    def columnCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def data(self, index: QtCore.QModelIndex, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self.entries[index.row()]
+        column = index.column()
+        if role == QtCore.Qt.DisplayRole:
+            return entry.texts[column]
+        if role == QtCore.Qt.ToolTipRole:
+            return entry.tooltips[column]
+        if role == QtCore.Qt.TextAlignmentRole and column not in TEAM_COLUMNS:
+            return QtCore.Qt.AlignCenter
+        if role == QtCore.Qt.ForegroundRole and column == LINK_COLUMN:
+            return self.link_brush
+        return None
+
+    def headerData(self,
+                   section: int,
+                   orientation: QtCore.Qt.Orientation,
+                   role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return HEADERS[section]
+        return None
 
 
 class MatchHistoryTab(QtWidgets.QWidget):
 
     def __init__(self, parent):
         super().__init__(parent)
-        # List of added matches. New ones at the end.
-        self.matches: List[MatchEntry] = []
-
-        # Scroll content
-        scroll_content = QtWidgets.QWidget()
-        self.scroll_layout = QtWidgets.QGridLayout(self)
-        self.scroll_layout.setContentsMargins(10, 10, 10, 10)
-        self.scroll_layout.setAlignment(QtCore.Qt.AlignTop)
-        scroll_content.setLayout(self.scroll_layout)
-
-        # Scroll area
-        scroll = QtWidgets.QScrollArea()
-        scroll.setVerticalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOn)
-        scroll.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
-        scroll.setWidgetResizable(True)
-        scroll.setWidget(scroll_content)
-
-        # Add scroll are to layout
+        # Ids of games that were already processed
+        self.game_ids: Set[int] = set()
+
+        self.model = MatchHistoryModel(self)
+
+        # Only visible rows are rendered
+        self.view = QtWidgets.QTableView()
+        self.view.setModel(self.model)
+        self.view.setShowGrid(False)
+        self.view.setWordWrap(False)
+        self.view.setAlternatingRowColors(True)
+        self.view.setSelectionBehavior(
+            QtWidgets.QAbstractItemView.SelectRows)
+        self.view.setVerticalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOn)
+        self.view.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
+        self.view.verticalHeader().hide()
+        self.view.verticalHeader().setSectionResizeMode(
+            QtWidgets.QHeaderView.Fixed)
+        self.view.verticalHeader().setDefaultSectionSize(
+            self.view.fontMetrics().height() + 8)
+
+        header = self.view.horizontalHeader()
+        header.setDefaultAlignment(QtCore.Qt.AlignCenter)
+        header.setStyleSheet("font-weight: bold")
+        # Sized from a sample of rows, not all of them
+        header.setSectionResizeMode(QtWidgets.QHeaderView.ResizeToContents)
+        for column in TEAM_COLUMNS:
+            header.setSectionResizeMode(column, QtWidgets.QHeaderView.Stretch)
+
+        self.view.clicked.connect(self.open_link)
+
         layout = QtWidgets.QVBoxLayout(self)
-        layout.addWidget(scroll)
+        layout.addWidget(self.view)
         layout.setContentsMargins(0, 0, 0, 0)
         self.setLayout(layout)
 
-        # Header
-        self.scroll_layout.addWidget(QtWidgets.QLabel("Team 1"), 0, 0)
-        self.scroll_layout.addWidget(QtWidgets.QLabel("Team 2"), 0, 1)
-        self.scroll_layout.addWidget(QtWidgets.QLabel("Map"), 0, 2)
-        self.scroll_layout.addWidget(QtWidgets.QLabel("Started"), 0, 3)
-        self.scroll_layout.addWidget(QtWidgets.QLabel("Mode"), 0, 4)
-        self.scroll_layout.addWidget(QtWidgets.QLabel("Result"), 0, 5)
-        self.scroll_layout.addWidget(QtWidgets.QLabel("Rating diff"), 0, 6)
-        self.scroll_layout.addWidget(QtWidgets.QLabel("AoE4World"), 0, 7)
-
-        self.header_widgets = set()
-        for i in range(self.scroll_layout.count()):
-            self.scroll_layout.itemAt(i).widget().setAlignment(
-                QtCore.Qt.AlignHCenter)
-            self.scroll_layout.itemAt(i).widget().setStyleSheet(
-                "font-weight: bold")
-            self.header_widgets.add(self.scroll_layout.itemAt(i).widget())
-
-    def clear_scroll_layout(self):
-        """ Removes all widgets from the scroll layout
-        All except the header widgets"""
-        for match in self.matches:
-            match.remove_from_layout()
+    def open_link(self, index: QtCore.QModelIndex):
+        """ Opens aoe4world page of the game when its link is clicked"""
+        if index.column() == LINK_COLUMN:
+            webbrowser.open(self.model.entries[index.row()].link)
 
     def clear_games(self):
         """ Removes all games from the game tab"""
-        self.clear_scroll_layout()
-        self.matches = []
+        self.game_ids = set()
+        self.model.clear()
 
     @catch_exceptions(logger)
     def update_widgets(self, match_history: List[Any]):
-        # Remove widgets from the layout
-        self.clear_scroll_layout()
+        """ Inserts new games to their rows and evicts the oldest ones
 
-        # Add new matches to our list
-        present_game_ids = {i.game_id for i in self.matches}
-
-        for match in reversed(match_history):
+        Pages of history can come in any order"""
+        for match in match_history:
             if match['ongoing']:
                 continue
-            if match['game_id'] in present_game_ids:
-                continue
-            self.matches.append(MatchEntry(self.scroll_layout, match))
-
-        # Re-add widgets to the layout
-        added_rows = 1  # With header
-        for match_entry in reversed(self.matches):
-            if match_entry.in_layout:
+            if match['game_id'] in self.game_ids:
                 continue
-            if added_rows > settings.max_games_history * 2:
+            # Too old to be shown
+            if self.model.row_for(
+                    match['started_at']) >= settings.max_games_history:
                 continue
-            match_entry.add_to_layout(added_rows)
-            added_rows += 2
+            self.model.insert_entry(MatchEntry(match))
+            self.game_ids.add(match['game_id'])
+
+        for entry in self.model.evict(settings.max_games_history):
+            self.game_ids.discard(entry.game_id)
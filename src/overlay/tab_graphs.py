@@ -1,10 +1,14 @@
-from typing import Any, Dict, List
+import threading
+from functools import partial
+from typing import Dict, List, Optional, Tuple
 
 from PyQt5 import QtWidgets
 
-from overlay.api_checking import get_rating_history
+from overlay.api_checking import (LEADERBOARD_IDS, get_for_leaderboards,
+                                  get_new_rating_history)
 from overlay.graph_widget import GraphWidget
 from overlay.logging_func import get_logger
+from overlay.rating_cache import rating_cache
 from overlay.settings import settings
 from overlay.worker import scheldule
 
@@ -12,11 +16,16 @@ logger = get_logger(__name__)
 
 
 class GraphTab(QtWidgets.QWidget):
+    # Only one update at a time syncs rating history with the cache
+    sync_lock = threading.Lock()
+
     def __init__(self, parent):
         super().__init__(parent)
         layout = QtWidgets.QVBoxLayout()
         self.setLayout(layout)
         self.plot_visibility: Dict[int, bool] = dict()
+        # Profile whose rating history is plotted
+        self.plotted_profile_id: Optional[int] = None
 
         # Graph
         self.graph = GraphWidget()
@@ -27,8 +36,12 @@ class GraphTab(QtWidgets.QWidget):
         layout.addWidget(self.graph)
 
     def run_update(self):
-        """ Gets new data and updates graphs"""
-        scheldule(self.plot_data, self.get_all_rating_history)
+        """ Gets new data and updates graphs
+
+        Only new points are added when the graph already shows this player"""
+        full = self.plotted_profile_id != settings.profile_id
+        scheldule(partial(self.plot_data, full), self.get_all_rating_history,
+                  full)
 
     def change_plot_visibility(self, index: int, action: QtWidgets.QAction):
         """ Updates plot visibility for given `index`"""
@@ -42,27 +55,51 @@ class GraphTab(QtWidgets.QWidget):
         self.graph.max_x_diff = 24 * 60 * 60 if action.isChecked() else -1
         self.graph.update()
 
-    @staticmethod
-    def get_all_rating_history() -> Dict[int, List[Any]]:
-        """ Gets rating history for all game modes"""
-        result = dict()
-        for id in range(17, 21):
-            result[id] = get_rating_history(id, amount=150)
-        return result
+    @classmethod
+    def get_all_rating_history(
+            cls, full: bool) -> Dict[int, List[Tuple[int, int]]]:
+        """ Gets new rating history points for all game modes and caches them
 
-    def plot_data(self, data: Dict[int, List[Any]]):
+        Only points of leaderboards that finished in time are cached, so the
+        next update downloads the rest again.
+        With `full` returns all cached points instead of only the new ones"""
+        profile_id = settings.profile_id
+        if not profile_id:
+            return {}
+        with cls.sync_lock:
+            since = {
+                id: rating_cache.last_timestamp(profile_id, id)
+                for id in LEADERBOARD_IDS
+            }
+            new_points = get_for_leaderboards(
+                lambda id: get_new_rating_history(id, since[id]))
+            for id, points in new_points.items():
+                rating_cache.append(profile_id, id, points)
+        if not full:
+            return new_points
+        return {
+            id: rating_cache.load(profile_id, id)
+            for id in LEADERBOARD_IDS
+        }
+
+    def plot_data(self, full: bool, data: Dict[int, List[Tuple[int, int]]]):
         if data is None:
             logger.warning("No graph data")
             return
         self.graph.title = f"Rating history ({settings.player_name})"
-        self.graph.clear_data()
+        if full:
+            self.graph.clear_data()
+            self.plotted_profile_id = settings.profile_id
         for id, values in data.items():
             if not values:
                 continue
             index = id - 16
+            x = [i[0] for i in values]
+            y = [i[1] for i in values]
+            if self.graph.has_plot(index):
+                self.graph.append_data(index, x, y)
+                continue
             label = f"{index}v{index}"
-            y = [i['rating'] for i in values]
-            x = [i['timestamp'] for i in values]
             self.graph.plot(x,
                             y,
                             label=label,
@@ -9,9 +9,11 @@ import keyboard
 from PyQt5 import QtWidgets
 
 import overlay.helper_func as hf
-from overlay.api_checking import Api_checker, get_full_match_history
+from overlay.api_checking import Api_checker, sync_match_history
+from overlay.assets import image_assets
 from overlay.logging_func import get_logger, log_match
 from overlay.settings import settings
+from overlay.snapshots import GameSnapshot
 from overlay.tab_build_orders import BoTab
 from overlay.tab_games import MatchHistoryTab
 from overlay.tab_graphs import GraphTab
@@ -20,7 +22,7 @@ from overlay.tab_random import RandomTab
 from overlay.tab_settings import SettingsTab
 from overlay.tab_stats import StatsTab
 from overlay.websocket import Websocket_manager
-from overlay.worker import scheldule
+from overlay.worker import scheldule, scheldule_async
 
 logger = get_logger(__name__)
 
@@ -31,7 +33,8 @@ class TabWidget(QtWidgets.QTabWidget):
         super().__init__(parent)
         self.version = version
         self.api_checker = Api_checker()
-        self.websocket_manager = Websocket_manager(settings.websocket_port)
+        self.websocket_manager = Websocket_manager(
+            settings.websocket_port, settings.websocket_high_water_mark)
         self.force_stop: bool = False
         self.prevent_overlay_update: bool = False
 
@@ -60,9 +63,12 @@ class TabWidget(QtWidgets.QTabWidget):
         )
         self.check_for_new_version()
         hf.create_custom_files()
+        image_assets.preload_flags()
         self.settigns_tab.start()
-        self.run_new_game_check()
+        # Api checks run on the same event loop as the websocket server
         self.websocket_manager.run()
+        self.api_checker.loop = self.websocket_manager.loop
+        self.run_new_game_check()
         self.send_ws_colors()
         self.check_waking()
 
@@ -80,22 +86,32 @@ class TabWidget(QtWidgets.QTabWidget):
         self.parent().update_title(settings.player_name)
 
     def update_with_match_history_data(self, amount: int):
-        """ Gets match history and updates games tab and passes data to stats tab"""
-        scheldule(self.got_match_history, get_full_match_history, amount)
+        """ Gets match history and updates games tab and passes data to stats tab
 
-    def got_match_history(self, match_history: List[Any]):
-        if match_history is None:
+        Stored games are shown first, then newer games page by page"""
+        scheldule(self.match_history_synced,
+                  sync_match_history,
+                  amount,
+                  progress_callback=self.got_match_history)
+
+    def match_history_synced(self, downloaded: Optional[int]):
+        if downloaded is None:
             self.settigns_tab.aoe4net_error_msg()
             logger.warning("No match history data")
             return
         self.settigns_tab.message("")
+
+    def got_match_history(self, match_history: List[Any]):
+        """ Receives a page of match history"""
         # self.stats_tab.update_other_stats(match_history)
         self.games_tab.update_widgets(match_history)
 
-    def run_new_game_check(self, delayed_seconds: int = 0):
-        """ Creates a new thread for a new api check"""
-        scheldule(self.new_game, self.api_checker.check_for_new_game,
-                  delayed_seconds)
+    def run_new_game_check(self, delayed_seconds: Optional[float] = None):
+        """ Scheldules a new api check"""
+        scheldule_async(self.new_game,
+                        self.api_checker.check_for_new_game,
+                        delayed_seconds,
+                        loop=self.api_checker.loop)
 
     def new_game(self, game_data: Optional[Dict[str, Any]]):
         """Received new data from api check, passes data along and reruns the check"""
@@ -128,12 +144,13 @@ class TabWidget(QtWidgets.QTabWidget):
                     "data": processed
                 })
 
-        self.run_new_game_check(delayed_seconds=30)
+        # The scheduler decides when to check again
+        self.run_new_game_check()
 
     def stop_checking_api(self):
         """ The app is closing, we need to start shuttings things down"""
         self.force_stop = True
-        self.api_checker.force_stop = True
+        self.api_checker.stop()
 
     def check_for_new_version(self):
         """ Checks for a new version, creates a button if there is one """
@@ -145,7 +162,7 @@ class TabWidget(QtWidgets.QTabWidget):
             partial(webbrowser.open, link))
         self.settigns_tab.update_button.show()
 
-    def override_event(self, data: Dict[str, Any]):
+    def override_event(self, data: GameSnapshot):
         self.settigns_tab.overlay_widget.update_data(data)
         self.websocket_manager.send({"type": "player_data", "data": data})
 
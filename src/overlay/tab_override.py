@@ -1,25 +1,21 @@
-from typing import Any, Callable, Dict
+from typing import Callable, Optional
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 
 from overlay.aoe4_data import civ_data
-from overlay.helper_func import file_path, zeroed
+from overlay.assets import flag_path, image_assets
+from overlay.helper_func import zeroed
 from overlay.logging_func import get_logger
 from overlay.overlay_widget import AoEOverlay, PlayerWidget
 from overlay.settings import settings
+from overlay.snapshots import GameSnapshot, PlayerSnapshot
 
 logger = get_logger(__name__)
-ICON_CACHE = {}
 
 
 def get_icon(civ: str) -> QtGui.QIcon:
-    """ Gets icon for a civilization. Handles caching."""
-    if civ in ICON_CACHE:
-        return ICON_CACHE[civ]
-    path = file_path(f"img/flags/{civ}.webp")
-    icon = QtGui.QIcon(path)
-    ICON_CACHE[civ] = icon
-    return icon
+    """ Gets icon for a civilization"""
+    return image_assets.icon(flag_path(civ))
 
 
 class InnerPlayer(PlayerWidget):
@@ -96,28 +92,27 @@ class InnerPlayer(PlayerWidget):
     def update_flag(self):
         self.flag.setCurrentText(self.civ)
 
-    def update_player(self, player_data: Dict[str, Any]):
+    def update_player(self, player_data: PlayerSnapshot):
         # We don't want the automatic update to look like the user made the change
         self.disconnect_changes()
         super().update_player(player_data)
         self.team_cb.setCurrentIndex(self.team)
         self.connect_to_function(self.callable)
 
-    def get_data(self) -> Dict[str, Any]:
+    def get_data(self) -> PlayerSnapshot:
         # Override to get civ from flag
-        return {
-            'civ': self.flag.currentText(),
-            'name': self.name.text(),
-            'team': self.team,
-            'rating': self.rating.text(),
-            'rank': self.rank.text(),
-            'wins': self.wins.text(),
-            'losses': self.losses.text(),
-            'winrate': self.winrate.text(),
-            'civ_games': self.civ_games.text(),
-            'civ_winrate': self.civ_winrate.text(),
-            'civ_win_length_median': self.civ_median_wins.text(),
-        }
+        return PlayerSnapshot(
+            civ=self.flag.currentText(),
+            name=self.name.text(),
+            team=self.team,
+            rating=self.rating.text(),
+            rank=self.rank.text(),
+            wins=self.wins.text(),
+            losses=self.losses.text(),
+            winrate=self.winrate.text(),
+            civ_games=self.civ_games.text(),
+            civ_winrate=self.civ_winrate.text(),
+            civ_win_length_median=self.civ_median_wins.text())
 
 
 class InnerOverlay(AoEOverlay):
@@ -154,7 +149,7 @@ class InnerOverlay(AoEOverlay):
             self.players.append(InnerPlayer(i + 1, self.playerlayout))
             self.players[-1].connect_to_function(self.changed)
 
-    def update_data(self, player_data: Dict[str, Any]):
+    def update_data(self, player_data: GameSnapshot):
         self.map.textChanged.disconnect()
         super().update_data(player_data)
         self.map.textChanged.connect(self.changed)
@@ -169,8 +164,8 @@ class OverrideTab(QtWidgets.QWidget):
 
     def __init__(self, parent):
         super().__init__(parent)
-        self.live_data = {}
-        self.changed_data = {}
+        self.live_data: Optional[GameSnapshot] = None
+        self.changed_data: Optional[GameSnapshot] = None
         layout = QtWidgets.QVBoxLayout()
         layout.setAlignment(QtCore.Qt.AlignLeft | QtCore.Qt.AlignTop)
         layout.setSpacing(15)
@@ -217,22 +212,22 @@ class OverrideTab(QtWidgets.QWidget):
         layout.addWidget(self.overlay_widget)
         self.overlay_widget.show()
 
-    def update_data(self, player_data: Dict[str, Any]):
+    def update_data(self, player_data: GameSnapshot):
         self.live_data = player_data
         if not self.prevent_ck.isChecked():
             self.overlay_widget.update_data(player_data)
             self.changed_data = player_data
 
-    def overlay_changed(self, data: Dict[str, Any]):
+    def overlay_changed(self, data: GameSnapshot):
         self.changed_data = data
 
     def override_overlay(self):
-        if not self.changed_data:
+        if self.changed_data is None:
             return
         self.data_override.emit(self.changed_data)
 
     def reset_overlay(self):
-        if not self.live_data:
+        if self.live_data is None:
             return
         self.overlay_widget.update_data(self.live_data)
         self.changed_data = self.overlay_widget.get_data()
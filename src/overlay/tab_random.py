@@ -1,9 +1,10 @@
 import random
-from typing import Dict, Optional
+from typing import Optional
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 
 from overlay.aoe4_data import civ_data, map_data
+from overlay.assets import flag_path, image_assets
 from overlay.helper_func import file_path
 
 
@@ -13,7 +14,6 @@ class RandomTab(QtWidgets.QWidget):
         super().__init__(parent)
         self.current_map: Optional[str] = None
         self.current_civ: Optional[str] = None
-        self.pixmaps: Dict[str, QtGui.QPixmap] = dict()
         self.initUI()
         self.randomize_map()
         self.randomize_civ()
@@ -32,6 +32,7 @@ class RandomTab(QtWidgets.QWidget):
         # Civ image
         self.civ_image = QtWidgets.QLabel()
         self.civ_image.setFixedSize(QtCore.QSize(270, 150))
+        image_assets.register_size(270, 150, QtCore.Qt.KeepAspectRatio)
         civ_layout.addWidget(self.civ_image)
 
         # Civ label
@@ -72,17 +73,9 @@ class RandomTab(QtWidgets.QWidget):
 
     def get_pixmap(self, file_path: str,
                    widget: QtWidgets.QWidget) -> QtGui.QPixmap:
-        """ Asset manager for pixmaps
-
-        Returns a pixmap from `file_path` scaled for `widget`"""
-        if file_path in self.pixmaps:
-            return self.pixmaps[file_path]
-        pixmap = QtGui.QPixmap(file_path)
-        pixmap = pixmap.scaled(widget.width(), widget.height(),
-                               QtCore.Qt.KeepAspectRatio,
-                               QtCore.Qt.FastTransformation)
-        self.pixmaps[file_path] = pixmap
-        return pixmap
+        """ Returns a pixmap from `file_path` scaled for `widget`"""
+        return image_assets.pixmap(file_path, widget.width(), widget.height(),
+                                   QtCore.Qt.KeepAspectRatio)
 
     def randomize_civ(self):
         civ_name = random.choice(tuple(civ_data.values()))
@@ -91,8 +84,7 @@ class RandomTab(QtWidgets.QWidget):
             return
         self.current_civ = civ_name
 
-        img_path = file_path(f"img/flags/{civ_name}.webp")
-        pixmap = self.get_pixmap(img_path, self.civ_image)
+        pixmap = self.get_pixmap(flag_path(civ_name), self.civ_image)
         self.civ_image.setPixmap(pixmap)
         self.civ_label.setText(civ_name)
 
@@ -1,9 +1,10 @@
-from typing import Any, Dict, List
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
 
 from PyQt5 import QtCore, QtWidgets
 
 from overlay.aoe4_data import civ_data, map_data, mode_data
-from overlay.api_checking import get_leaderboard_data
+from overlay.api_checking import get_for_leaderboards, get_leaderboard_data
 from overlay.helper_func import match_mode
 from overlay.logging_func import catch_exceptions, get_logger
 from overlay.settings import settings
@@ -12,12 +13,46 @@ from overlay.worker import scheldule
 logger = get_logger(__name__)
 
 
+class MatchData:
+    """ Wins and losses of analyzed games counted per (civ, map, mode)
+
+    Games aren't kept, the counts are updated as they are added, so any
+    filter is answered without going through the games."""
+
+    def __init__(self):
+        self.match_ids = set()
+        # Wins and losses for each (civ, map, mode)
+        self.cube: Dict[Tuple[int, int, int],
+                        List[int]] = defaultdict(lambda: [0, 0])
+
+    def __len__(self) -> int:
+        return len(self.match_ids)
+
+    def append(self, civ: int, map_id: int, mode: int, win: bool,
+               match_id: int):
+        self.match_ids.add(match_id)
+        self.cube[civ, map_id, mode][0 if win else 1] += 1
+
+    def filtered_cube(
+            self,
+            civ: Optional[int] = None,
+            mode: Optional[int] = None
+    ) -> Dict[Tuple[int, int, int], List[int]]:
+        """ Slice of the cube with given civ and mode (`None` for all)"""
+        return {
+            key: result
+            for key, result in self.cube.items()
+            if (civ is None or key[0] == civ) and (
+                mode is None or key[2] == mode)
+        }
+
+
 class StatsTab(QtWidgets.QWidget):
 
     def __init__(self, parent):
         super().__init__(parent)
         self.leaderboard_data: Dict[int, Dict[str, Any]] = {}
-        self.match_data: List[Dict[str, Any]] = []
+        self.match_data = MatchData()
         self.initUI()
 
     def initUI(self):
@@ -201,10 +236,8 @@ class StatsTab(QtWidgets.QWidget):
         scheldule(self.update_leaderboard_data, self.get_all_leaderboard_data)
 
     def get_all_leaderboard_data(self):
-        result = dict()
-        for leaderboard_id in mode_data:
-            result[leaderboard_id] = get_leaderboard_data(leaderboard_id)
-        return result
+        return get_for_leaderboards(get_leaderboard_data,
+                                    leaderboard_ids=mode_data)
 
     def update_leaderboard_data(self, leaderboard: Dict[int, Dict[str, Any]]):
         """ Update data and widgets"""
@@ -238,9 +271,8 @@ class StatsTab(QtWidgets.QWidget):
     @catch_exceptions(logger)
     def update_other_stats(self, match_history: List[Any]):
         # Add to our match history data
-        present_match_ids = {m['match_id'] for m in self.match_data}
         for match in reversed(match_history):
-            if match['match_id'] not in present_match_ids:
+            if match['match_id'] not in self.match_data.match_ids:
                 self.add_match_data(match)
         self.update_civ_map_stats()
         logger.info(
@@ -250,54 +282,47 @@ class StatsTab(QtWidgets.QWidget):
     @catch_exceptions(logger)
     def add_match_data(self, match: Dict[str, Any]):
         """ Saves only specific data from the match history data"""
-        game = dict()  # includes: win, mode, map, civ
         if match['result'] not in {"Loss", "Win"}:
             return
-        game['map'] = match.get('map_type', -1)
-        game['win'] = match['result'] == "Win"
-        game['mode'] = match_mode(match)
-        game['match_id'] = match['match_id']
         for player in match['players']:
             if player['profile_id'] == settings.profile_id:
-                game['civ'] = player['civ']
+                civ = player['civ']
                 break
-        if 'civ' not in game:
+        else:
             return
-        self.match_data.append(game)
+        self.match_data.append(civ, match.get('map_type', -1),
+                               match_mode(match), match['result'] == "Win",
+                               match['match_id'])
 
     def clear_match_data(self):
-        self.match_data = []
+        self.match_data = MatchData()
         self.update_civ_map_stats()
 
     @catch_exceptions(logger)
     def update_civ_map_stats(self):
-        # Filter games based on the selected civilization
-        fdata = self.match_data
+        # Filter games based on the selected civilization and mode
+        filter_civ = None
         if self.civ_box.currentIndex() != 0:
             filter_civ = self.civ_box.currentIndex() - 1
-            fdata = [g for g in self.match_data if g['civ'] == filter_civ]
-
-        # Filter games based on the selected mode
+        filter_mode = None
         if self.mode_box.currentIndex() != 0:
             filter_mode = self.mode_box.currentIndex() + 16
-            fdata = [g for g in fdata if g['mode'] == filter_mode]
+        cube = self.match_data.filtered_cube(filter_civ, filter_mode)
 
         # Update the number of analyzed games
-        self.games_found.setText(f"Recent games analyzed: {len(fdata)} (?)")
+        games = sum(wins + losses for wins, losses in cube.values())
+        self.games_found.setText(f"Recent games analyzed: {games} (?)")
 
         # Get specific civ and map data from filtered games
         civ_stats = {c_index: {"wins": 0, "losses": 0} for c_index in civ_data}
         map_stats = {m_index: {"wins": 0, "losses": 0} for m_index in map_data}
-        # game = {"map": None, "win": None, "mode": None, "civ": None}
-        for game in fdata:
-            c = game['civ']
-            m = game['map']
-            if game['win']:
-                civ_stats[c]['wins'] += 1
-                map_stats[m]['wins'] += 1
-            else:
-                civ_stats[c]['losses'] += 1
-                map_stats[m]['losses'] += 1
+        for (c, m, _), (wins, losses) in cube.items():
+            if c in civ_stats:
+                civ_stats[c]['wins'] += wins
+                civ_stats[c]['losses'] += losses
+            if m in map_stats:
+                map_stats[m]['wins'] += wins
+                map_stats[m]['losses'] += losses
 
         # Update civ widgets
         for civ_index, c_data in civ_stats.items():
@@ -1,86 +1,390 @@
 import asyncio
+import gzip
 import json
 import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple, Union
+from urllib.parse import parse_qs, urlparse
 
 import websockets
 from websockets.legacy.server import serve as websockets_serve
 
 from overlay.logging_func import get_logger
+from overlay.snapshots import to_json_default
 
 lock = threading.Lock()
 logger = get_logger(__name__)
 
+# How many recent messages are kept for clients that fall behind
+HISTORY_SIZE = 20
+# Frames larger than this are sent gzipped to clients that ask for it
+GZIP_MIN_SIZE = 1024
+# Message types that can be sent as a patch of the previous message
+DELTA_TYPES = {"player_data"}
+# Seconds to wait for a message to be sent to a client
+SEND_TIMEOUT = 1
+# Clients are disconnected after this many timed-out messages in a row
+MAX_TIMEOUTS = 3
+
+
+def _pointer(path: str, key: Union[str, int]) -> str:
+    """ Extends JSON pointer `path` with `key`"""
+    return f"{path}/{str(key).replace('~', '~0').replace('/', '~1')}"
+
+
+def json_patch(old: Any, new: Any, path: str = "") -> List[Dict[str, Any]]:
+    """ Returns JSON-patch style operations that change `old` into `new`
+
+    Dictionaries and lists of the same length are compared item by item,
+    anything else is replaced as a whole."""
+    if old == new:
+        return []
+
+    if isinstance(old, dict) and isinstance(new, dict):
+        patch = []
+        for key in old:
+            if key not in new:
+                patch.append({"op": "remove", "path": _pointer(path, key)})
+        for key, value in new.items():
+            if key not in old:
+                patch.append({
+                    "op": "add",
+                    "path": _pointer(path, key),
+                    "value": value
+                })
+            else:
+                patch.extend(json_patch(old[key], value, _pointer(path,
+                                                                  key)))
+        return patch
+
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(
+            new):
+        patch = []
+        for idx, (old_item, new_item) in enumerate(zip(old, new)):
+            patch.extend(json_patch(old_item, new_item, _pointer(path, idx)))
+        return patch
+
+    return [{"op": "replace", "path": path, "value": new}]
+
+
+class Frame:
+    """ Message encoded once and shared by all clients
+
+    For `DELTA_TYPES` it also contains a patch against the previous message
+    of the same type (`base`), if the patch is smaller than the message."""
+    __slots__ = ('id', 'type', 'text', 'patch', 'base', '_gzipped')
+
+    def __init__(self,
+                 message: Dict[str, Any],
+                 message_id: int,
+                 previous: Optional[Tuple[int, Any]] = None):
+        self.id: int = message_id
+        self.type: str = message.get('type')
+        self.text: str = json.dumps({**message, "id": message_id},
+                                    default=to_json_default)
+        self.patch: Optional[str] = None
+        self.base: Optional[int] = None
+        self._gzipped: Optional[bytes] = None
+
+        if previous is not None:
+            base_id, base_data = previous
+            patch = json.dumps({
+                "type": "patch",
+                "target": self.type,
+                "id": message_id,
+                "base": base_id,
+                "patch": json_patch(base_data, self.decoded_data())
+            })
+            if len(patch) < len(self.text):
+                self.patch = patch
+                self.base = base_id
+
+    def decoded_data(self) -> Any:
+        """ Returns message data the same way clients decode it"""
+        return json.loads(self.text).get('data')
+
+    def data(self, use_gzip: bool) -> Union[str, bytes]:
+        """ Returns text frame or (for large messages) gzipped bytes frame"""
+        if not use_gzip or len(self.text) < GZIP_MIN_SIZE:
+            return self.text
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.text.encode(), compresslevel=6)
+        return self._gzipped
+
+
+class _Client:
+    """ State of one connected websocket client"""
+    __slots__ = ('websocket', 'use_gzip', 'use_delta', 'sent', 'confirmed',
+                 'resync', 'connected', 'messages_sent', 'coalesced',
+                 'timeouts', 'timeouts_in_row', 'last_send_ms', 'max_send_ms')
+
+    def __init__(self,
+                 websocket: websockets.legacy.server.WebSocketServerProtocol,
+                 path: str):
+        query = parse_qs(urlparse(path).query, keep_blank_values=True)
+        self.websocket = websocket
+        # Clients can ask for gzipped frames with `ws://localhost:port/?gzip`
+        self.use_gzip: bool = 'gzip' in query
+        # and for patches instead of full messages with `?delta`
+        self.use_delta: bool = 'delta' in query
+        # Id of the last message sent
+        self.sent: int = 0
+        # Last message id of each type the client acknowledged to have
+        self.confirmed: Dict[str, int] = {}
+        # The client needs a full snapshot (new client or asked for it)
+        self.resync: bool = True
+        # Metrics
+        self.connected: float = time.time()
+        self.messages_sent: int = 0
+        self.coalesced: int = 0  # Messages skipped as newer ones replaced them
+        self.timeouts: int = 0
+        self.timeouts_in_row: int = 0
+        self.last_send_ms: float = 0
+        self.max_send_ms: float = 0
+
+    def frame_data(self, frame: Frame) -> Union[str, bytes]:
+        """ Returns a patch if the client has its base, otherwise full frame"""
+        if (self.use_delta and frame.patch is not None
+                and self.confirmed.get(frame.type) == frame.base):
+            return frame.patch
+        return frame.data(self.use_gzip)
+
 
 class Websocket_manager():
-    """ Class managing connection through a websocket to the HTML file"""
-    def __init__(self, port: int):
-        self.overlay_messages = []
+    """ Class managing connection through a websocket to the HTML file
+
+    Clients with more than `high_water_mark` messages waiting get only the
+    latest message of each type. Clients that keep timing out are disconnected
+    and get the current state once they reconnect."""
+    def __init__(self, port: int, high_water_mark: int = 5):
+        # Latest message for each message type (color, player_data, ...)
+        self.snapshot: Dict[str, Frame] = {}
+        # Recent messages, clients lagging further get a snapshot
+        self.history: Deque[Frame] = deque(maxlen=HISTORY_SIZE)
+        self.last_id: int = 0
         self.port = port
+        self.high_water_mark = high_water_mark
+        self.clients: Set[_Client] = set()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.new_message: Optional[asyncio.Condition] = None
+        # Used in `send` for assigning ids and creating patches
+        self._next_id: int = 0
+        self._last_data: Dict[str, Tuple[int, Any]] = {}
 
     def run(self):
+        # The loop exists right away, so other async tasks can be scheduled on it
+        with lock:
+            self.loop = asyncio.new_event_loop()
         self.thread_server = threading.Thread(target=self._start_manager,
                                               daemon=True)
         self.thread_server.start()
 
     def _start_manager(self):
+        asyncio.set_event_loop(self.loop)
+        self.new_message = asyncio.Condition()
         try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            start_server = websockets_serve(self.manager, 'localhost',
-                                            self.port)
-            loop.run_until_complete(start_server)
-            loop.run_forever()
+            # Messages are compressed once in `Frame` instead of per client
+            start_server = websockets_serve(self.manager,
+                                            'localhost',
+                                            self.port,
+                                            compression=None)
+            self.loop.run_until_complete(start_server)
         except Exception:
             logger.exception("Failed to start manager")
+        # Keep running even without the server, the loop is used for api checks
+        self.loop.run_forever()
 
     @staticmethod
-    async def _send_ws_message(
-            websocket: websockets.legacy.server.WebSocketServerProtocol,
-            message):
-        message = json.dumps(message)
-        await asyncio.wait_for(asyncio.gather(websocket.send(message)),
-                               timeout=1)
+    async def _send_ws_message(client: _Client, frame: Frame):
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.gather(
+                client.websocket.send(client.frame_data(frame))),
+                                   timeout=SEND_TIMEOUT)
+        except asyncio.TimeoutError:
+            client.timeouts += 1
+            client.timeouts_in_row += 1
+            raise
+        client.timeouts_in_row = 0
+        client.messages_sent += 1
+        client.last_send_ms = (time.perf_counter() - start) * 1000
+        client.max_send_ms = max(client.max_send_ms, client.last_send_ms)
+
+    async def _wait_for_message(self, client: _Client) -> bool:
+        """ Waits until there is a message that hasn't been sent yet
+        Returns `False` if the connection was closed instead"""
+        async def wait_new_message():
+            async with self.new_message:
+                await self.new_message.wait_for(
+                    lambda: self.last_id > client.sent or client.resync)
+
+        waiting = asyncio.ensure_future(wait_new_message())
+        closed = asyncio.ensure_future(client.websocket.wait_closed())
+        await asyncio.wait((waiting, closed),
+                           return_when=asyncio.FIRST_COMPLETED)
+        for task in (waiting, closed):
+            task.cancel()
+        return not client.websocket.closed
+
+    async def _read_client_messages(self, client: _Client):
+        """ Reads acknowledgements and resync requests from the client"""
+        async for text in client.websocket:
+            try:
+                message = json.loads(text)
+                if message.get('type') == 'ack':
+                    self._acknowledge(client, message['id'])
+                elif message.get('type') == 'resync':
+                    client.confirmed.clear()
+                    client.resync = True
+                    await self._notify_clients()
+            except Exception:
+                logger.warning(f"Invalid message from a client: {text}")
+
+    def _acknowledge(self, client: _Client, message_id: int):
+        """ Saves that the client has the message with `message_id`"""
+        if self.history and message_id >= self.history[0].id:
+            frame = self.history[message_id - self.history[0].id]
+        else:
+            # Snapshot frames can be older than the history
+            for frame in self.snapshot.values():
+                if frame.id == message_id:
+                    break
+            else:
+                return
+        if message_id > client.confirmed.get(frame.type, 0):
+            client.confirmed[frame.type] = message_id
+
+    async def _send_snapshot(self, client: _Client):
+        """ Sends the latest message of each type"""
+        client.sent = self.last_id
+        # Stays set until the whole snapshot is sent
+        client.resync = True
+        for frame in list(self.snapshot.values()):
+            await self._send_ws_message(client, frame)
+        client.resync = False
+
+    async def _send_coalesced(self, client: _Client):
+        """ Sends only the latest message of each type the client is missing"""
+        frames = sorted(
+            (f for f in self.snapshot.values() if f.id > client.sent),
+            key=lambda f: f.id)
+        client.coalesced += self.last_id - client.sent - len(frames)
+        client.sent = self.last_id
+        try:
+            for frame in frames:
+                await self._send_ws_message(client, frame)
+        except asyncio.TimeoutError:
+            # Don't lose the remaining message types
+            client.resync = True
+            raise
+
+    def _client_metrics(self, client: _Client) -> Dict[str, Any]:
+        return {
+            "address": client.websocket.remote_address,
+            "connected_seconds": round(time.time() - client.connected),
+            "lag": self.last_id - client.sent,
+            "sent": client.messages_sent,
+            "coalesced": client.coalesced,
+            "timeouts": client.timeouts,
+            "last_send_ms": round(client.last_send_ms, 2),
+            "max_send_ms": round(client.max_send_ms, 2)
+        }
+
+    def client_metrics(self) -> List[Dict[str, Any]]:
+        """ Returns metrics (lag in messages, send times, ...) for each connected client"""
+        return [self._client_metrics(client) for client in list(self.clients)]
 
     async def manager(
             self, websocket: websockets.legacy.server.WebSocketServerProtocol,
             path: str):
         """ Manages websocket connection for each client """
         logger.info(f"Opening: {websocket}")
+        client = _Client(websocket, path)
+        self.clients.add(client)
+        reader = asyncio.ensure_future(self._read_client_messages(client))
 
-        # Send the first one (init) and last one message if there is one
-        if self.overlay_messages:
-            await self._send_ws_message(websocket, self.overlay_messages[0])
-            if self.overlay_messages[0] != self.overlay_messages[-1]:
-                await self._send_ws_message(websocket,
-                                            self.overlay_messages[-1])
+        try:
+            while True:
+                try:
+                    # Sleeps until `send` notifies about a new message
+                    if self.last_id == client.sent and not client.resync:
+                        if not await self._wait_for_message(client):
+                            logger.warning('Websocket connection closed.')
+                            break
 
-        sent = len(self.overlay_messages)
+                    # Missed messages aren't available anymore, resync instead
+                    if client.resync or self.history[0].id > client.sent + 1:
+                        if not client.resync:
+                            logger.warning(
+                                f'Client lagged {self.last_id - client.sent} messages behind, sending snapshot.'
+                            )
+                        await self._send_snapshot(client)
+                        continue
 
-        while True:
-            try:
-                if len(self.overlay_messages) == sent:
-                    continue
-                await self._send_ws_message(websocket,
-                                            self.overlay_messages[sent])
-                sent += 1
-
-            except asyncio.TimeoutError:
-                logger.warning(f'#{sent-1} message was timed-out.')
-            except websockets.exceptions.ConnectionClosedOK:
-                logger.warning('Websocket connection closed (ok).')
-                break
-            except websockets.exceptions.ConnectionClosedError:
-                logger.warning('Websocket connection closed (error).')
-                break
-            except websockets.exceptions.ConnectionClosed:
-                logger.warning('Websocket connection closed.')
-                break
-            except Exception:
-                logger.exception("")
-            finally:
-                await asyncio.sleep(0.1)
+                    # Too many messages waiting, skip the outdated ones
+                    if self.last_id - client.sent > self.high_water_mark:
+                        await self._send_coalesced(client)
+                        continue
+
+                    frame = self.history[client.sent + 1 - self.history[0].id]
+                    # Timed-out message is likely buffered already, don't resend
+                    client.sent = frame.id
+                    await self._send_ws_message(client, frame)
+
+                except asyncio.TimeoutError:
+                    logger.warning(f'#{client.sent} message was timed-out.')
+                    if client.timeouts_in_row >= MAX_TIMEOUTS:
+                        logger.warning(
+                            f'Disconnecting slow client: {self._client_metrics(client)}'
+                        )
+                        break
+                except websockets.exceptions.ConnectionClosedOK:
+                    logger.warning('Websocket connection closed (ok).')
+                    break
+                except websockets.exceptions.ConnectionClosedError:
+                    logger.warning('Websocket connection closed (error).')
+                    break
+                except websockets.exceptions.ConnectionClosed:
+                    logger.warning('Websocket connection closed.')
+                    break
+                except Exception:
+                    logger.exception("")
+                    await asyncio.sleep(0.1)
+        finally:
+            reader.cancel()
+            self.clients.discard(client)
 
-    def send(self, message):
+    async def _notify_clients(self):
+        async with self.new_message:
+            self.new_message.notify_all()
+
+    def _store_frame(self, frame: Frame):
+        """ Updates the snapshot and the history with a new message"""
+        self.last_id = frame.id
+        self.snapshot[frame.type] = frame
+        self.history.append(frame)
+
+    def _add_frame(self, frame: Frame):
+        """ Adds a message and wakes up all clients waiting for it"""
+        self._store_frame(frame)
+        asyncio.ensure_future(self._notify_clients())
+
+    def send(self, message: Dict[str, Any]):
         """ Send message throught a websocket """
         with lock:
-            self.overlay_messages.append(message)
+            self._next_id += 1
+            message_type = message.get('type')
+
+            # Serialize only once, all clients share the frame
+            frame = Frame(message, self._next_id,
+                          self._last_data.get(message_type))
+            if message_type in DELTA_TYPES:
+                self._last_data[message_type] = (frame.id,
+                                                 frame.decoded_data())
+
+            if self.loop is None:
+                # The server isn't running yet, there is nobody to wake up
+                self._store_frame(frame)
+                return
+            self.loop.call_soon_threadsafe(self._add_frame, frame)
@@ -1,3 +1,5 @@
+import asyncio
+import concurrent.futures
 import sys
 import traceback
 from typing import Callable, Optional
@@ -75,10 +77,53 @@ class Worker(QtCore.QRunnable):
 def scheldule(result_callback: Callable,
               worker_function: Callable,
               *args,
-              error_callback: Optional[Callable] = None):
-    """ Scheldules work on the worker function and passes the result to the callback function"""
-    thread = Worker(worker_function, *args)
+              error_callback: Optional[Callable] = None,
+              progress_callback: Optional[Callable] = None):
+    """ Scheldules work on the worker function and passes the result to the callback function
+
+    With `progress_callback` the worker function gets `progress_callback` signal for partial results"""
+    if progress_callback is None:
+        thread = Worker(worker_function, *args)
+    else:
+        thread = Worker(worker_function, *args, progress_callback=None)
+        thread.signals.progress.connect(progress_callback)
     thread.signals.result.connect(result_callback)
     if error_callback is not None:
         thread.signals.error.connect(error_callback)
-    THREADPOOL.start(thread)
\ No newline at end of file
+    THREADPOOL.start(thread)
+
+
+def scheldule_async(result_callback: Callable,
+                    coroutine_function: Callable,
+                    *args,
+                    loop: asyncio.AbstractEventLoop,
+                    error_callback: Optional[Callable] = None
+                    ) -> concurrent.futures.Future:
+    """ Scheldules the coroutine function on the asyncio `loop` and passes the result to the callback function
+
+    Returns a future that can be used to cancel it"""
+    signals = WorkerSignals()
+    signals.result.connect(result_callback)
+    if error_callback is not None:
+        signals.error.connect(error_callback)
+
+    def done(future: concurrent.futures.Future):
+        if future.cancelled():
+            return
+        try:
+            exception = future.exception()
+            if exception is None:
+                signals.result.emit(future.result())
+            else:
+                logger.error("", exc_info=exception)
+                signals.error.emit(
+                    (type(exception), exception, "".join(
+                        traceback.format_exception(type(exception), exception,
+                                                   exception.__traceback__))))
+            signals.finished.emit()
+        except RuntimeError:
+            logger.exception('Error with pyqt signals. The app likely closed.')
+
+    future = asyncio.run_coroutine_threadsafe(coroutine_function(*args), loop)
+    future.add_done_callback(done)
+    return future